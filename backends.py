@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import importlib
+
+OS_RELEASE_PATHS = ("/etc/os-release", "/usr/lib/os-release")
+
+# os-release ID -> (build plugin, kernel management module). Derivatives
+# are matched through ID_LIKE, so Manjaro uses arch and Mint uses ubuntu.
+# Plugins are imported only once chosen to keep startup cheap.
+REGISTRY = {
+    "arch": ("arch", "kernel_man"),
+    "ubuntu": ("ubuntu", "kernel_man"),
+    "debian": ("ubuntu", "kernel_man"),
+    "fedora": ("fedora", "kernel_man"),
+    "rhel": ("fedora", "kernel_man"),
+}
+
+
+class BackendError(Exception):
+    pass
+
+
+def register(distro_id, plugin, manager):
+    REGISTRY[distro_id] = (plugin, manager)
+
+
+def os_release(paths=OS_RELEASE_PATHS):
+    for path in paths:
+        try:
+            with open(path) as release_file:
+                fields = {}
+                for line in release_file:
+                    key, _, value = line.strip().partition("=")
+                    if key and not key.startswith("#"):
+                        fields[key] = value.strip("\"'")
+                return fields
+        except OSError:
+            continue
+    return {}
+
+
+def detect(fields=None):
+    fields = os_release() if fields is None else fields
+    candidates = [fields.get("ID", "").lower(), *fields.get("ID_LIKE", "").lower().split()]
+    for candidate in candidates:
+        if candidate in REGISTRY:
+            return candidate
+    raise BackendError(f"Unsupported distribution {candidates[0] or 'unknown'}, supported: {', '.join(sorted(REGISTRY))}")
+
+
+def load(name):
+    import engine
+
+    return engine.Backend(name, importlib.import_module(REGISTRY[name][0]))
+
+
+def load_manager(name):
+    return importlib.import_module(REGISTRY[name][1])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+LEGACY = """
+import sys, tarfile
+sys.path.insert(0, {here!r})
+from engine import print_progress_bar
+with tarfile.open({archive!r}, 'r:xz') as tar:
+    total_files = len(tar.getmembers())
+    extracted_files = 0
+    for member in tar.getmembers():
+        tar.extract(member)
+        extracted_files += 1
+        print_progress_bar(extracted_files, total_files, prefix='Extracting:', suffix='Complete', length=50)
+"""
+
+STREAMING = """
+import sys
+sys.path.insert(0, {here!r})
+from engine import print_progress_bar
+import extractor
+extractor.extract_archive({archive!r}, progress=lambda done, total: print_progress_bar(done, total, prefix='Extracting:', suffix='Complete', length=50), backend={backend!r})
+"""
+
+# Largest of the interpreter and any decompressor it spawned, in KiB
+REPORT_RSS = """
+import resource
+sys.stderr.write(str(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)))
+"""
+
+
+def make_archive(directory, files, size):
+    tree = os.path.join(directory, "linux-bench")
+    rng = random.Random(0)
+    words = [bytes(rng.choice(b"abcdefghijklmnopqrstuvwxyz_ ;{}()\n") for _ in range(64)) for _ in range(256)]
+    for idx in range(files):
+        subdir = os.path.join(tree, f"drivers{idx % 40}", f"sub{idx % 7}")
+        os.makedirs(subdir, exist_ok=True)
+        with open(os.path.join(subdir, f"file{idx}.c"), "wb") as source:
+            source.write(b"".join(rng.choice(words) for _ in range(size // 64)))
+    archive = os.path.join(directory, "linux-bench.tar.xz")
+    with tarfile.open(archive, "w:xz") as tar:
+        tar.add(tree, arcname="linux-bench")
+    shutil.rmtree(tree)
+    return archive
+
+
+def run(code, workdir):
+    os.makedirs(workdir)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code + REPORT_RSS], cwd=workdir, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(workdir)
+    return elapsed, int(result.stderr.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy and streaming kernel extraction")
+    parser.add_argument('--files', type=int, default=5000)
+    parser.add_argument('--size', type=int, default=4096, help='Bytes per synthetic source file')
+    parser.add_argument('--make-archive', metavar='DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.make_archive:
+        make_archive(args.make_archive, args.files, args.size)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Build the archive in a child: xz compression is memory hungry and
+        # ru_maxrss is inherited across fork/exec by the measured children
+        subprocess.run([sys.executable, __file__, '--files', str(args.files), '--size', str(args.size), '--make-archive', directory], check=True)
+        archive = os.path.join(directory, "linux-bench.tar.xz")
+        print(f"Archive: {args.files} files, {os.path.getsize(archive) / 1024 / 1024:.1f} MiB compressed")
+        cases = [("streaming/python", STREAMING.format(here=HERE, archive=archive, backend="python"))]
+        for backend, command in extractor_backends():
+            cases.append((f"streaming/{backend}", STREAMING.format(here=HERE, archive=archive, backend=backend)))
+        cases.append(("legacy", LEGACY.format(here=HERE, archive=archive)))
+        print(f"{'implementation':<20} {'wall (s)':>10} {'peak RSS (MiB)':>15}")
+        for name, code in cases:
+            elapsed, peak = run(code, os.path.join(directory, name.replace("/", "-")))
+            print(f"{name:<20} {elapsed:>10.2f} {peak / 1024:>15.1f}")
+
+
+def extractor_backends():
+    sys.path.insert(0, HERE)
+    import extractor
+    return [(name, command) for name, command in extractor.EXTERNAL_BACKENDS.items() if shutil.which(command[0])]
+
+
+if __name__ == "__main__":
+    main()
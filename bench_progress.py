@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import progress
+from engine import print_progress_bar
+
+
+def preallocate(path, total):
+    # Every run rewrites this file in place, so no case pays for growing it
+    with open(path, "wb") as output:
+        output.truncate(total)
+        output.write(os.urandom(1024 * 1024) * (total // (1024 * 1024)))
+        os.fsync(output.fileno())
+
+
+def write_chunks(path, total, chunk_size, update):
+    # The same loop shape as download_single: write a chunk, report progress
+    chunk = os.urandom(chunk_size)
+    done = 0
+    start = time.perf_counter()
+    with open(path, "r+b") as output:
+        output.seek(0)
+        while done < total:
+            output.write(chunk)
+            done += chunk_size
+            update(done, total)
+        output.flush()
+        os.fsync(output.fileno())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure progress rendering overhead against the I/O it reports on")
+    parser.add_argument('--size', type=int, default=140, help='MiB written, about one kernel tarball')
+    parser.add_argument('--chunk', type=int, default=1024, help='Bytes per progress update')
+    parser.add_argument('--runs', type=int, default=5, help='Runs of each case, interleaved')
+    parser.add_argument('--tty', action='store_true', help='Render to this terminal instead of /dev/null')
+    args = parser.parse_args()
+
+    total = args.size * 1024 * 1024
+    updates = total // args.chunk
+    stream = sys.stdout if args.tty else open(os.devnull, "w")
+    displays = []
+
+    def legacy(path):
+        with contextlib.redirect_stdout(stream):
+            return write_chunks(path, total, args.chunk, lambda done, total: print_progress_bar(done, total, prefix='Downloading:', suffix='Complete', length=50))
+
+    def rendered(path):
+        displays.append(progress.Display(stream, tty=True))
+        with displays[-1].bar("Downloading", total) as bar:
+            return write_chunks(path, total, args.chunk, bar.update)
+
+    # The baseline makes the same call per chunk, it just draws nothing
+    cases = {
+        "none (I/O only)": lambda path: write_chunks(path, total, args.chunk, lambda done, total: None),
+        "print_progress_bar": legacy,
+        "progress.Display": rendered,
+    }
+    times = {name: [] for name in cases}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "payload")
+        preallocate(path, total)
+        # Round robin, so drift in disk or CPU speed hits every case alike
+        for _ in range(args.runs):
+            for name, case in cases.items():
+                times[name].append(case(path))
+
+    baseline = statistics.median(times["none (I/O only)"])
+    draws = {"none (I/O only)": 0, "print_progress_bar": updates, "progress.Display": displays[-1].renders}
+    print(f"{args.size} MiB in {updates} updates of {args.chunk} bytes, median and min of {args.runs} runs")
+    print(f"{'renderer':<22} {'median (s)':>11} {'min (s)':>9} {'overhead (s)':>13} {'per update (us)':>16} {'draws':>8}")
+    for name, runs in times.items():
+        median = statistics.median(runs)
+        overhead = median - baseline
+        print(f"{name:<22} {median:>11.2f} {min(runs):>9.2f} {overhead:>13.2f} {overhead / updates * 1e6:>16.2f} {draws[name]:>8}")
+    legacy_overhead = statistics.median(times["print_progress_bar"]) - baseline
+    display_overhead = statistics.median(times["progress.Display"]) - baseline
+    spread = max(times["none (I/O only)"]) - min(times["none (I/O only)"])
+    print(f"\nprogress.Display adds {100 * display_overhead / baseline:.1f}% to the I/O time, print_progress_bar {100 * legacy_overhead / baseline:.1f}%")
+    print(f"The baseline varies by {spread:.2f}s between runs, smaller differences are noise")
+
+
+if __name__ == "__main__":
+    main()
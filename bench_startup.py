@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(HERE, "main.py")
+
+
+def wall_times(command, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def import_times(command):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    result = subprocess.run([sys.executable, "-X", "importtime", *command], cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only top level imports, nested ones are part of their parent's time
+        if not name.startswith("  "):
+            modules.append((int(cumulative) / 1000, name.strip()))
+    return sorted(modules, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure kernel-builder startup time")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--target', type=float, default=100.0, help='Startup budget in milliseconds')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to show')
+    parser.add_argument('args', nargs='*', default=['--quiet', 'list'], help='Arguments passed to main.py')
+    args = parser.parse_args()
+
+    baseline = statistics.median(wall_times([sys.executable, "-c", "pass"], args.runs))
+    startup = wall_times([sys.executable, MAIN, *args.args], args.runs)
+    median = statistics.median(startup)
+    print(f"main.py {' '.join(args.args)}: median {median:.1f} ms, min {min(startup):.1f} ms over {args.runs} runs")
+    print(f"bare interpreter: median {baseline:.1f} ms")
+
+    print("\nSlowest top level imports:")
+    for cumulative, name in import_times([MAIN, *args.args])[:args.top]:
+        print(f"{cumulative:>9.1f} ms  {name}")
+
+    verdict = "within" if median <= args.target else "over"
+    print(f"\n{median:.1f} ms is {verdict} the {args.target:.0f} ms budget")
+    sys.exit(0 if median <= args.target else 1)
+
+
+if __name__ == "__main__":
+    main()
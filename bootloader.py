@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+
+import cache
+import inventory
+import runner
+
+CACHE_VERSION = 1
+# Where an EFI system partition is usually mounted
+ESP_DIRS = ("efi", "boot/efi", "boot")
+GRUB_CONFIGS = ("boot/grub/grub.cfg", "boot/grub2/grub.cfg")
+GRUB_DEFAULTS = "etc/default/grub"
+CMDLINE_FILE = "etc/kernel/cmdline"
+# Loader options that belong to one kernel, not to the machine
+ENTRY_OPTIONS = ("BOOT_IMAGE=", "initrd=")
+
+
+def cache_path(root="/"):
+    name = "bootloader.json" if root == "/" else f"bootloader-{hashlib.sha256(root.encode()).hexdigest()[:12]}.json"
+    return os.path.join(cache.cache_dir(), name)
+
+
+def watched(root="/"):
+    # Installing, removing or reconfiguring a bootloader touches one of these
+    paths = [os.path.join(root, "boot"), os.path.join(root, GRUB_DEFAULTS)]
+    paths += [os.path.join(root, name) for name in GRUB_CONFIGS]
+    for esp in ESP_DIRS:
+        paths += [os.path.join(root, esp), os.path.join(root, esp, "loader"), os.path.join(root, esp, "EFI/systemd")]
+    return paths
+
+
+def grub_uses_bls(root="/"):
+    try:
+        with open(os.path.join(root, GRUB_DEFAULTS)) as defaults:
+            return any(line.strip().replace('"', "") == "GRUB_ENABLE_BLSCFG=true" for line in defaults)
+    except OSError:
+        return False
+
+
+def probe_commands():
+    # Only used when the files say nothing, each probe is a process spawn
+    try:
+        if "systemd-boot" in subprocess.run(["bootctl", "status"], capture_output=True, text=True).stdout.lower():
+            return {"name": "systemd-boot", "esp": None, "bls": False}
+    except FileNotFoundError:
+        pass
+    try:
+        if "GRUB" in subprocess.run(["grub-install", "--version"], capture_output=True, text=True).stdout:
+            return {"name": "grub", "esp": None, "bls": False}
+    except FileNotFoundError:
+        pass
+    return {"name": None, "esp": None, "bls": False}
+
+
+def probe(root="/"):
+    for esp in ESP_DIRS:
+        path = os.path.join(root, esp)
+        if glob.glob(os.path.join(path, "EFI/systemd/systemd-boot*.efi")) and os.path.isdir(os.path.join(path, "loader")):
+            return {"name": "systemd-boot", "esp": path, "bls": True}
+    if any(os.path.exists(os.path.join(root, name)) for name in GRUB_CONFIGS):
+        return {"name": "grub", "esp": None, "bls": grub_uses_bls(root)}
+    return probe_commands() if root == "/" else {"name": None, "esp": None, "bls": False}
+
+
+def detect(root="/", refresh=False):
+    path = cache_path(root)
+    if not refresh:
+        try:
+            with open(path) as cache_file:
+                cached = json.load(cache_file)
+            if cached.get("version") == CACHE_VERSION and cached.get("root") == root and inventory.stamps(cached["stamps"]) == cached["stamps"]:
+                return cached["loader"]
+        except (OSError, ValueError, KeyError):
+            pass
+    loader = probe(root)
+    try:
+        os.makedirs(cache.cache_dir(), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as cache_file:
+            json.dump({"version": CACHE_VERSION, "root": root, "stamps": inventory.stamps(watched(root)), "loader": loader}, cache_file)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return loader
+
+
+def partition_root(path, root="/"):
+    # BLS paths are relative to the file system the entry lives on
+    path = os.path.dirname(os.path.abspath(path))
+    while path != os.path.abspath(root) and not os.path.ismount(path) and path != "/":
+        path = os.path.dirname(path)
+    return path
+
+
+def machine_id(root="/"):
+    try:
+        with open(os.path.join(root, "etc/machine-id")) as id_file:
+            return id_file.read().strip() or None
+    except OSError:
+        return None
+
+
+def kernel_options(entries_dir, root="/"):
+    # The machine's command line from kernel-install's file, another entry,
+    # or the running kernel
+    try:
+        with open(os.path.join(root, CMDLINE_FILE)) as cmdline:
+            return " ".join(cmdline.read().split())
+    except OSError:
+        pass
+    for entry in sorted(glob.glob(os.path.join(entries_dir, "*.conf")), key=os.path.getmtime, reverse=True):
+        try:
+            options = inventory.parse_bls(entry).get("options")
+        except OSError:
+            continue
+        if options:
+            return options
+    if root != "/":
+        return None
+    try:
+        with open("/proc/cmdline") as cmdline:
+            return " ".join(option for option in cmdline.read().split() if not option.startswith(ENTRY_OPTIONS))
+    except OSError:
+        return None
+
+
+def entries_dir(loader, image, root="/"):
+    # systemd-boot reads entries from the ESP it was installed to, GRUB with
+    # BLS from /boot; either way the kernel has to be on that partition
+    if loader["name"] == "systemd-boot":
+        partition = loader["esp"]
+    elif loader["name"] == "grub" and loader["bls"]:
+        partition = os.path.join(root, "boot")
+    else:
+        return None
+    if not partition or partition_root(image, root) != partition_root(os.path.join(partition, "loader"), root):
+        return None
+    return os.path.join(partition, "loader/entries")
+
+
+def entry_text(record, options, root="/"):
+    def relative(path):
+        return "/" + os.path.relpath(path, partition_root(path, root))
+
+    release = record["release"]
+    lines = [f"title Linux {release}", f"version {release}", f"linux {relative(record['image'])}"]
+    initramfs = next((path for path in record["initramfs"] if "fallback" not in os.path.basename(path)), None)
+    if initramfs:
+        lines.append(f"initrd {relative(initramfs)}")
+    if options:
+        lines.append(f"options {options}")
+    return "\n".join(lines) + "\n"
+
+
+def install_file(text, target, debug=False):
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "w") as entry:
+            entry.write(text)
+        os.replace(tmp, target)
+        return True
+    except PermissionError:
+        pass
+    # /boot and the ESP are only writable by root
+    with tempfile.NamedTemporaryFile("w", suffix=".conf", delete=False) as entry:
+        entry.write(text)
+    command = ["sudo", "install", "-D", "-m", "644", entry.name, target]
+    if debug:
+        print(f"Running '{' '.join(command)}'")
+    try:
+        return runner.run(command) == 0
+    finally:
+        os.remove(entry.name)
+
+
+def write_entry(release, root="/", loader=None, debug=False):
+    # Returns the kernel's entry, or None when the loader needs a full regeneration
+    loader = loader or detect(root)
+    record = next((record for record in inventory.installed_kernels(root) if record["release"] == release), None)
+    if not record or not record["image"]:
+        return None
+    if record["entries"]:
+        # Already in the menu, e.g. arch.conf from the distribution's hooks
+        return record["entries"][0]
+    directory = entries_dir(loader, record["image"], root)
+    if not directory:
+        return None
+    options = kernel_options(directory, root)
+    name = f"{machine_id(root) or 'kernel-builder'}-{release}.conf"
+    target = os.path.join(directory, name)
+    if not install_file(entry_text(record, options, root), target, debug):
+        return None
+    return target
+
+
+def update(release, regenerate, root="/", debug=False):
+    # A single Boot Loader Specification entry when the bootloader reads
+    # them, otherwise regenerate(loader) rebuilds the whole configuration
+    loader = detect(root)
+    if debug:
+        print(f"Bootloader: {loader['name'] or 'unknown'}{' with BLS entries' if loader['bls'] else ''}")
+    if release and loader["bls"]:
+        target = write_entry(release, root, loader, debug)
+        if target:
+            print(f"Boot entry {target}")
+            return True
+        if debug:
+            print(f"Cannot write a boot entry for {release}, regenerating the bootloader configuration")
+    return regenerate(loader)
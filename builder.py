@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import cache
+
+OBJDIR_POINTER = ".kernel-builder-objdir"
+DEFAULT_COMPILER_CACHE_SIZE = "20G"
+COMPILER_CACHES = ("ccache", "sccache")
+
+
+class BuildError(Exception):
+    pass
+
+
+def build_root():
+    return os.environ.get("KERNEL_BUILDER_BUILD_ROOT") or os.path.join(cache.cache_dir(), "build")
+
+
+def config_fingerprint(config_path):
+    with open(config_path, "rb") as config_file:
+        return hashlib.sha256(config_file.read()).hexdigest()[:16]
+
+
+def object_dir(srctree):
+    try:
+        with open(os.path.join(srctree, OBJDIR_POINTER)) as pointer:
+            objdir = pointer.read().strip()
+    except OSError:
+        return None
+    return objdir if os.path.isdir(objdir) else None
+
+
+def prepare_build_dir(srctree, version, sudo=False, debug=False):
+    # Out-of-tree builds keep one O= directory per version and .config, so
+    # rebuilding after a patch only recompiles what changed
+    config = os.path.join(srctree, ".config")
+    if not os.path.exists(config):
+        objdir = object_dir(srctree)
+        if objdir and os.path.exists(os.path.join(objdir, ".config")):
+            return objdir
+        raise BuildError(f"No .config in {srctree}, configure the kernel first")
+
+    objdir = os.path.join(build_root(), f"linux-{version}-{config_fingerprint(config)}")
+    os.makedirs(objdir, exist_ok=True)
+    if not os.path.exists(os.path.join(objdir, ".config")):
+        shutil.copyfile(config, os.path.join(objdir, ".config"))
+    elif debug:
+        print(f"Reusing build directory {objdir}")
+
+    # kbuild refuses O= while the source tree holds a configuration; the
+    # .config has been saved to the build directory so mrproper is safe
+    prefix = ["sudo"] if sudo else []
+    subprocess.run(prefix + ["make", "-s", "-C", srctree, "mrproper"], check=True)
+    with open(os.path.join(srctree, OBJDIR_POINTER), "w") as pointer:
+        pointer.write(objdir)
+    return objdir
+
+
+def make_args(objdir):
+    return [f"O={objdir}"] if objdir else []
+
+
+def choose_compiler_cache(preference="auto"):
+    if preference == "none":
+        return None
+    if preference != "auto":
+        if not shutil.which(preference):
+            raise BuildError(f"{preference} is not installed")
+        return preference
+    for launcher in COMPILER_CACHES:
+        if shutil.which(launcher):
+            return launcher
+    return None
+
+
+def compiler_args(launcher, wrapper=()):
+    # A wrapper (the compile profiler) only goes in front of the target compiler
+    compiler = os.environ.get("CC", "gcc")
+    if not launcher and not wrapper:
+        return []
+    args = [f"CC={' '.join([*wrapper, *([launcher] if launcher else []), compiler])}"]
+    return args + ([f"HOSTCC={launcher} {compiler}"] if launcher else [])
+
+
+def compiler_cache_env(launcher, srctree, max_size=DEFAULT_COMPILER_CACHE_SIZE):
+    if not launcher:
+        return {}
+    cache_path = os.path.join(cache.cache_dir(), launcher)
+    if launcher == "ccache":
+        return {
+            "CCACHE_DIR": cache_path,
+            "CCACHE_MAXSIZE": max_size,
+            # Share hits between build directories and extraction paths
+            "CCACHE_BASEDIR": os.path.dirname(os.path.abspath(srctree)),
+            "CCACHE_NOHASHDIR": "1",
+        }
+    if launcher == "sccache":
+        return {"SCCACHE_DIR": cache_path, "SCCACHE_CACHE_SIZE": max_size}
+    return {}
+
+
+def env_command(command, env, sudo=False):
+    # Returns the command line and environment to run it with
+    if sudo:
+        # sudo resets the environment, so pass the cache settings through env(1)
+        return ["sudo", "env", *[f"{key}={value}" for key, value in env.items()], *command], None
+    return command, {**os.environ, **env}
+
+
+def run_with_env(command, env, sudo=False, **kwargs):
+    command, env = env_command(command, env, sudo)
+    return subprocess.run(command, env=env, **kwargs)
+
+
+def zero_stats(launcher, env, sudo=False):
+    command = {"ccache": ["ccache", "-z"], "sccache": ["sccache", "--zero-stats"]}[launcher]
+    run_with_env(command, env, sudo, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def parse_ccache_stats(output):
+    # "ccache --print-stats" prints tab separated counters (ccache 4.x)
+    counters = {}
+    for line in output.splitlines():
+        key, _, value = line.partition("\t")
+        if value.strip().isdigit():
+            counters[key.strip()] = int(value)
+    if counters:
+        hits = counters.get("direct_cache_hit", 0) + counters.get("preprocessed_cache_hit", 0)
+        return hits, counters.get("cache_miss", 0)
+    hits = sum(int(n) for n in re.findall(r'cache hit \((?:direct|preprocessed)\)\s+(\d+)', output))
+    misses = re.search(r'cache miss\s+(\d+)', output)
+    return hits, int(misses.group(1)) if misses else 0
+
+
+def parse_sccache_stats(output):
+    stats = json.loads(output).get("stats", {})
+    hits = sum(stats.get("cache_hits", {}).get("counts", {}).values())
+    misses = sum(stats.get("cache_misses", {}).get("counts", {}).values())
+    return hits, misses
+
+
+def cache_stats(launcher, env, sudo=False):
+    try:
+        if launcher == "ccache":
+            result = run_with_env(["ccache", "--print-stats"], env, sudo, capture_output=True, text=True)
+            if result.returncode != 0:
+                result = run_with_env(["ccache", "-s"], env, sudo, capture_output=True, text=True)
+            return parse_ccache_stats(result.stdout)
+        result = run_with_env(["sccache", "--show-stats", "--stats-format=json"], env, sudo, capture_output=True, text=True)
+        return parse_sccache_stats(result.stdout)
+    except (OSError, ValueError):
+        return None
+
+
+def format_hit_rate(stats):
+    hits, misses = stats
+    total = hits + misses
+    rate = 100.0 * hits / total if total else 0.0
+    return f"{hits} hits, {misses} misses ({rate:.1f}% hit rate)"
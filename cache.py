@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+import errno
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+DEFAULT_MAX_SIZE = 4 * 1024 ** 3
+HASH_CHUNK_SIZE = 1024 * 1024
+FICLONE = 0x40049409
+SHA256SUM_LINE = re.compile(r'^([0-9a-f]{64})\s+\*?(\S+)$')
+
+
+class CacheError(Exception):
+    pass
+
+
+def cache_dir():
+    if os.environ.get("KERNEL_BUILDER_CACHE"):
+        return os.environ["KERNEL_BUILDER_CACHE"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "kernel-builder")
+
+
+def max_cache_size():
+    value = os.environ.get("KERNEL_BUILDER_CACHE_SIZE")
+    return parse_size(value) if value else DEFAULT_MAX_SIZE
+
+
+def parse_size(value):
+    units = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*', str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(match.group(1)) * units[match.group(2).upper()])
+
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            break
+        size /= 1024
+    return f"{size:.1f} {unit}"
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_sha256(path):
+    # Tarballs are hashed by several stages, remember the digest while the file is unchanged
+    info = os.stat(path)
+    return _sha256_for(os.path.realpath(path), info.st_ino, info.st_size, info.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=16)
+def _sha256_for(path, inode, size, mtime):
+    return sha256_file(path)
+
+
+def parse_sha256sums(text):
+    # sha256sums.asc is a clearsigned list of "<sha256>  <filename>" lines
+    sums = {}
+    for line in text.splitlines():
+        match = SHA256SUM_LINE.match(line.strip())
+        if match:
+            sums[match.group(2)] = match.group(1)
+    return sums
+
+
+def fetch_sha256sums(url, debug=False):
+    import requests
+
+    try:
+        response = requests.get(url, timeout=(10, 30))
+    except requests.RequestException as e:
+        if debug:
+            print(f"Could not fetch {url}: {e}")
+        return {}
+    if response.status_code != 200:
+        return {}
+    return parse_sha256sums(response.text)
+
+
+class SourceCache:
+    def __init__(self, root=None, max_size=None):
+        self.root = root or cache_dir()
+        self.max_size = max_size if max_size is not None else max_cache_size()
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        self.index_path = os.path.join(self.root, "index.json")
+        os.makedirs(self.objects_dir, mode=0o775, exist_ok=True)
+        os.makedirs(self.tmp_dir, mode=0o775, exist_ok=True)
+
+    def _lock(self, name="index.lock"):
+        lock_file = open(os.path.join(self.root, name), "a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as index_file:
+            json.dump(index, index_file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256)
+
+    def entries(self):
+        index = self._load_index()
+        return sorted(index.items(), key=lambda item: item[1]["last_used"], reverse=True)
+
+    def lookup(self, filename):
+        with self._lock():
+            index = self._load_index()
+            for sha256, entry in index.items():
+                path = self.object_path(sha256)
+                if entry["filename"] == filename and os.path.exists(path) and os.path.getsize(path) == entry["size"]:
+                    entry["last_used"] = time.time()
+                    self._save_index(index)
+                    return path
+        return None
+
+    def add(self, path, version, expected_sha256=None):
+        sha256 = sha256_file(path)
+        if expected_sha256 and sha256 != expected_sha256:
+            os.remove(path)
+            raise CacheError(f"Checksum mismatch for {os.path.basename(path)}: expected {expected_sha256}, got {sha256}")
+        target = self.object_path(sha256)
+        os.chmod(path, 0o644)
+        os.replace(path, target)
+        with self._lock():
+            index = self._load_index()
+            index[sha256] = {
+                "filename": os.path.basename(path),
+                "version": version,
+                "size": os.path.getsize(target),
+                "verified": expected_sha256 is not None,
+                "last_used": time.time(),
+            }
+            self._save_index(index)
+        self.evict(keep={sha256})
+        return target
+
+    def fetch(self, version, filename, download, sums_url=None, debug=False):
+        cached = self.lookup(filename)
+        if cached:
+            if debug:
+                print(f"Cache hit for {filename}: {cached}")
+            return cached, True
+
+        # One download per file: another process fetching the same tarball
+        # holds the lock until it is in the cache, then this one finds it there
+        with self._lock(os.path.join("tmp", f"{filename}.lock")):
+            cached = self.lookup(filename)
+            if cached:
+                if debug:
+                    print(f"Cache hit for {filename} after waiting for another download: {cached}")
+                return cached, True
+            expected = fetch_sha256sums(sums_url, debug).get(filename) if sums_url else None
+            if debug and sums_url and not expected:
+                print(f"No checksum for {filename} in {sums_url}, caching unverified")
+            tmp_path = os.path.join(self.tmp_dir, filename)
+            download(tmp_path)
+            return self.add(tmp_path, version, expected), False
+
+    def evict(self, max_size=None, keep=()):
+        max_size = self.max_size if max_size is None else max_size
+        removed = []
+        with self._lock():
+            index = self._load_index()
+            total = sum(entry["size"] for entry in index.values())
+            # Least recently used entries go first
+            for sha256, entry in sorted(index.items(), key=lambda item: item[1]["last_used"]):
+                if total <= max_size:
+                    break
+                if sha256 in keep:
+                    continue
+                try:
+                    os.remove(self.object_path(sha256))
+                except FileNotFoundError:
+                    pass
+                total -= entry["size"]
+                removed.append((sha256, index.pop(sha256)))
+            self._save_index(index)
+        return removed
+
+
+def link_into(source, destination):
+    # Hard link when possible, then a reflink clone, then a plain copy
+    try:
+        os.link(source, destination)
+        return "hardlink"
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOTSUP):
+            raise
+    try:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return "reflink"
+    except OSError:
+        pass
+    shutil.copyfile(source, destination)
+    return "copy"
+
+
+def list_cache():
+    source_cache = SourceCache()
+    entries = source_cache.entries()
+    if not entries:
+        print(f"Cache {source_cache.root} is empty.")
+        return
+    total = 0
+    print(f"Cache {source_cache.root}:")
+    for sha256, entry in entries:
+        last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"]))
+        verified = "verified" if entry.get("verified") else "unverified"
+        print(f"{entry['filename']:<28} {format_size(entry['size']):>11}  {last_used}  {verified:<10}  {sha256[:12]}")
+        total += entry["size"]
+    print(f"Total: {format_size(total)} of {format_size(source_cache.max_size)}")
+
+
+def prune_cache(max_size=None):
+    source_cache = SourceCache()
+    removed = source_cache.evict(max_size)
+    for sha256, entry in removed:
+        print(f"Removed {entry['filename']} ({format_size(entry['size'])})")
+    print(f"Pruned {len(removed)} cache entries, freed {format_size(sum(entry['size'] for _, entry in removed))}.")
+
+
+def run_command(action, max_size=None):
+    if action == "ls":
+        list_cache()
+    elif action == "prune":
+        try:
+            max_size = parse_size(max_size) if max_size is not None else None
+        except ValueError as e:
+            print(f"{e}, expected a size such as 2G or 500M")
+            return False
+        prune_cache(max_size)
+    return True
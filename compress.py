@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import subprocess
+
+import jobs
+
+CHOICES = ("auto", "zstd", "xz", "none")
+# Modules are compressed with the same flags kbuild uses, so a kernel with
+# CONFIG_MODULE_DECOMPRESS can still load them itself
+MODULE_COMMANDS = {
+    "zstd": ["zstd", "-T1", "--rm", "-f", "-q"],
+    "xz": ["xz", "--check=crc32", "--lzma2=dict=1MiB", "-f"],
+}
+MODULE_EXTENSIONS = {"zstd": ".zst", "xz": ".xz"}
+# Modules handed to each compressor process by xargs
+MODULES_PER_PROCESS = 16
+
+
+class CompressionError(Exception):
+    pass
+
+
+def threads():
+    return jobs.available_cpus()
+
+
+def require(name):
+    if not shutil.which(name):
+        raise CompressionError(f"{name} is not installed")
+    return name
+
+
+def configured_module_compression(config_path):
+    try:
+        with open(config_path) as config:
+            for line in config:
+                if line.strip() == "CONFIG_MODULE_COMPRESS_ZSTD=y":
+                    return "zstd"
+                if line.strip() == "CONFIG_MODULE_COMPRESS_XZ=y":
+                    return "xz"
+    except OSError:
+        pass
+    return None
+
+
+def module_compressor(preference, config_path):
+    # auto keeps whatever format the kernel config asks for
+    if preference == "none":
+        return None
+    name = configured_module_compression(config_path) if preference == "auto" else preference
+    return require(name) if name else None
+
+
+def initramfs_compressor(preference):
+    if preference == "none":
+        return None
+    if preference != "auto":
+        return require(preference)
+    return next((name for name in ("zstd", "xz") if shutil.which(name)), None)
+
+
+def initramfs_options(name, thread_count=None):
+    thread_count = thread_count or threads()
+    if name == "zstd":
+        return [f"-T{thread_count}"]
+    return [f"-T{thread_count}", "--check=crc32"]
+
+
+def find_modules(root):
+    modules = []
+    for directory, _, files in os.walk(root):
+        modules += [os.path.join(directory, name) for name in files if name.endswith(".ko")]
+    return modules
+
+
+def compress_modules(root, name, thread_count=None, sudo=False):
+    # xargs keeps one single threaded compressor per CPU busy, which beats
+    # a multithreaded compressor on thousands of small files
+    modules = find_modules(root)
+    if not modules:
+        return 0
+    prefix = ["sudo"] if sudo else []
+    command = [*prefix, "xargs", "-0", "-P", str(thread_count or threads()), "-n", str(MODULES_PER_PROCESS), *MODULE_COMMANDS[name]]
+    result = subprocess.run(command, input="\0".join(modules).encode())
+    if result.returncode != 0:
+        raise CompressionError(f"{name} failed with status {result.returncode}")
+    return len(modules)
+
+
+def tree_size(root):
+    if os.path.isfile(root):
+        return os.path.getsize(root)
+    total = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if not os.path.islink(path):
+                total += os.path.getsize(path)
+    return total
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_WORKERS = 8
+SEGMENT_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+TIMEOUT = (10, 60)
+
+# Bytes received by this process, read by the build telemetry
+received = {"bytes": 0}
+received_lock = threading.Lock()
+
+
+class DownloadError(Exception):
+    pass
+
+
+def count_received(size):
+    with received_lock:
+        received["bytes"] += size
+
+
+def received_bytes():
+    return received["bytes"]
+
+
+def make_session(workers=DEFAULT_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1), max_retries=3)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def probe(session, url):
+    # A one byte ranged GET tells us the size and whether the server honours Range
+    response = session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=TIMEOUT)
+    try:
+        if response.status_code == 206:
+            content_range = response.headers.get("Content-Range", "")
+            total = content_range.rsplit("/", 1)[-1]
+            if total.isdigit():
+                return int(total), True, response.headers.get("ETag")
+        if response.status_code not in (200, 206):
+            raise DownloadError(f"HTTP {response.status_code} for {url}")
+        length = response.headers.get("content-length")
+        return (int(length) if length else None), False, response.headers.get("ETag")
+    finally:
+        response.close()
+
+
+def split_ranges(total, segment_size=SEGMENT_SIZE):
+    return [(start, min(start + segment_size, total) - 1) for start in range(0, total, segment_size)]
+
+
+def load_state(state_path, url, total, etag):
+    try:
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+    except (OSError, ValueError):
+        return None
+    if state.get("url") != url or state.get("size") != total or state.get("etag") != etag:
+        return None
+    return state
+
+
+def save_state(state_path, state):
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(tmp_path, state_path)
+
+
+def download_file(url, filename, workers=DEFAULT_WORKERS, progress=None, debug=False, session=None):
+    session = session or make_session(workers)
+    total, ranged, etag = probe(session, url)
+    if not ranged or not total or workers < 2:
+        if debug and not ranged:
+            print(f"Server did not honour Range for {url}, using a single stream")
+        return download_single(session, url, filename, total, progress)
+    return download_segmented(session, url, filename, total, etag, workers, progress, debug)
+
+
+def download_single(session, url, filename, total=None, progress=None):
+    part_path = f"{filename}.part"
+    downloaded = 0
+    with session.get(url, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code != 200:
+            raise DownloadError(f"HTTP {response.status_code} for {url}")
+        if total is None and response.headers.get("content-length"):
+            total = int(response.headers["content-length"])
+        with open(part_path, "wb") as part_file:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                part_file.write(chunk)
+                downloaded += len(chunk)
+                count_received(len(chunk))
+                if progress:
+                    progress(downloaded, total)
+    if total is not None and downloaded != total:
+        raise DownloadError(f"Short read for {url}: got {downloaded} of {total} bytes")
+    os.replace(part_path, filename)
+    return downloaded
+
+
+def download_segmented(session, url, filename, total, etag, workers, progress=None, debug=False):
+    part_path = f"{filename}.part"
+    state_path = f"{part_path}.state"
+    segments = split_ranges(total)
+
+    state = load_state(state_path, url, total, etag)
+    if state is None or state.get("segment_size") != SEGMENT_SIZE or not os.path.exists(part_path):
+        state = {"url": url, "size": total, "etag": etag, "segment_size": SEGMENT_SIZE, "done": []}
+        with open(part_path, "wb") as part_file:
+            part_file.truncate(total)
+        save_state(state_path, state)
+    elif os.path.getsize(part_path) != total:
+        with open(part_path, "r+b") as part_file:
+            part_file.truncate(total)
+
+    done = set(state["done"])
+    pending = [idx for idx in range(len(segments)) if idx not in done]
+    if debug and done:
+        print(f"Resuming {filename}: {len(pending)} of {len(segments)} segments missing")
+
+    lock = threading.Lock()
+    counter = {"bytes": sum(segments[idx][1] - segments[idx][0] + 1 for idx in done)}
+
+    def fetch(idx):
+        start, end = segments[idx]
+        headers = {"Range": f"bytes={start}-{end}"}
+        offset = start
+        fd = os.open(part_path, os.O_WRONLY)
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+                if response.status_code != 206:
+                    raise DownloadError(f"HTTP {response.status_code} for range {start}-{end} of {url}")
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+                    count_received(len(chunk))
+                    with lock:
+                        counter["bytes"] += len(chunk)
+                        if progress:
+                            progress(counter["bytes"], total)
+            if offset != end + 1:
+                raise DownloadError(f"Short read for range {start}-{end} of {url}")
+        except Exception:
+            # The segment is fetched again on resume, so take it back out of the progress count
+            with lock:
+                counter["bytes"] -= offset - start
+            raise
+        finally:
+            os.close(fd)
+        with lock:
+            state["done"].append(idx)
+            save_state(state_path, state)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fetch, idx) for idx in pending]
+        errors = [future.exception() for future in futures if future.exception()]
+    if errors:
+        raise errors[0]
+
+    os.replace(part_path, filename)
+    os.remove(state_path)
+    return total
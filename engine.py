@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+import builder
+import cache
+import compress
+import extractor
+import farm
+import glob
+import jobs
+import kconfig
+import lzma
+import os
+import profiler
+import progress
+import releases
+import runner
+import re
+import series
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import time
+
+
+# ANSI color escape sequences
+class colors:
+    PURPLE = '\033[95m'
+    CYAN = '\033[96m'
+    DARKCYAN = '\033[36m'
+    BLUE = '\033[94m'
+    GREEN = '\033[92m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    BOLD = '\033[1m'
+    UNDERLINE = '\033[4m'
+    END = '\033[0m'
+
+KERNEL_BASE_URL = "https://www.kernel.org"
+
+def get_available_versions(debug=False, offline=False):
+    if debug:
+        print(f"{colors.DARKCYAN}Fetching available versions from {releases.RELEASES_URL}{colors.END}")
+    try:
+        versions, origin = releases.fetch_releases(offline=offline)
+    except releases.ReleasesError as e:
+        print(f"{colors.RED}Failed to fetch kernel versions ({e}). Check your internet connection.{colors.END}")
+        return []
+    if origin == "stale":
+        print(f"{colors.YELLOW}kernel.org is unreachable, using the last downloaded release list{colors.END}")
+    if debug:
+        print(f"{colors.GREEN}Fetched {len(versions)} versions ({origin}){colors.END}")
+    return versions
+
+def format_version_info(version_info):
+    version = version_info.get('version', 'Unknown Version')
+    released_date = version_info.get('released', {}).get('isodate', 'Unknown Date')
+    source_url = version_info.get('source', 'Unknown Source')
+    return f"{colors.BOLD}{version}{colors.END} - Released: {released_date}\n   Source: {source_url}"
+
+def choose_kernel_version(versions, debug=False):
+    print(f"{colors.PURPLE}Available Linux Kernel Versions:{colors.END}")
+    for idx, version_info in enumerate(versions, start=1):
+        formatted_info = format_version_info(version_info)
+        print(f"{idx}. {formatted_info}")
+
+    while True:
+        try:
+            selection = input("Enter the number of the kernel version to build: ")
+            index = int(selection) - 1
+            if 0 <= index < len(versions):
+                if debug:
+                    print(f"{colors.GREEN}Selected version: {versions[index].get('version')}{colors.END}")
+                return versions[index].get('version')
+            else:
+                print(f"{colors.RED}Invalid selection. Please enter a number from the list.{colors.END}")
+        except ValueError:
+            print(f"{colors.RED}Invalid input. Please enter a number.{colors.END}")
+
+def download_kernel(version, debug=False, workers=None):
+    # Networking modules are only loaded once a download actually runs
+    import downloader
+    import requests
+
+    filename = f"linux-{version}.tar.xz"
+    if os.path.exists(filename):
+        print(f"{colors.GREEN}Kernel {filename} already exists. Skipping download.{colors.END}")
+        return True
+
+    base_url = f"{KERNEL_BASE_URL}/pub/linux/kernel/v{version.split('.')[0]}.x"
+    url = f"{base_url}/{filename}"
+
+    def download(destination):
+        if debug:
+            print(f"{colors.CYAN}Downloading kernel from {url} with {workers} workers{colors.END}")
+        with progress.bar("Downloading") as bar:
+            downloader.download_file(url, destination, workers=workers or downloader.DEFAULT_WORKERS, progress=bar.update, debug=debug)
+        print(f"Downloaded {filename}")
+
+    try:
+        source_cache = cache.SourceCache()
+        cached_path, hit = source_cache.fetch(version, filename, download, sums_url=f"{base_url}/sha256sums.asc", debug=debug)
+        method = cache.link_into(cached_path, filename)
+    except (requests.RequestException, downloader.DownloadError) as e:
+        print(f"{colors.RED}Failed to download kernel ({e}). Rerun to resume the download.{colors.END}")
+        return False
+    except cache.CacheError as e:
+        print(f"{colors.RED}{e}{colors.END}")
+        return False
+    except OSError as e:
+        # A full disk, or a cache directory this user cannot write to
+        print(f"{colors.RED}Failed to store {filename} ({e}).{colors.END}")
+        return False
+    if hit:
+        print(f"{colors.GREEN}Using cached {filename} from {source_cache.root}{colors.END}")
+    if debug:
+        print(f"{colors.GREEN}Kernel {method} to {filename} from {cached_path}{colors.END}")
+    return True
+
+
+def extract_kernel(version, debug=False, decompressor="auto", patches=()):
+    dirname = f"linux-{version}"
+    if os.path.exists(dirname):
+        print(f"{colors.GREEN}Kernel already extracted to {dirname}. Skipping extraction.{colors.END}")
+        return True
+    # A tree already patched with the same series skips extracting and patching
+    if series.restore(series.series_key(f"{dirname}.tar.xz", patches), dirname, debug):
+        print(f"{colors.GREEN}Reused the cached patched tree for {dirname}{colors.END}")
+        return True
+
+    def extract(dest="."):
+        backend = extractor.choose_backend(decompressor)
+        if debug:
+            print(f"{colors.CYAN}Extracting linux-{version}.tar.xz with the {backend} decompressor{colors.END}")
+        with progress.bar("Extracting") as bar:
+            extractor.extract_archive(f"linux-{version}.tar.xz", dest, progress=bar.update, backend=backend)
+
+    try:
+        # One pristine tree per tarball, every working tree is a clone of it
+        method = farm.checkout(f"{dirname}.tar.xz", version, dirname, extract, debug)
+        if method:
+            print(f"{colors.GREEN}Cloned linux-{version} from the tree farm ({method}){colors.END}")
+            return True
+        extract()
+    except (OSError, EOFError, tarfile.TarError, lzma.LZMAError, extractor.ExtractError) as e:
+        print(f"{colors.RED}Failed to extract linux-{version}.tar.xz: {e}{colors.END}")
+        return False
+    print(f"Extracted linux-{version}")
+    if debug:
+        print(f"{colors.GREEN}Kernel extracted to {dirname}{colors.END}")
+    return True
+
+
+def fetch_and_extract_kernel(version, debug=False, decompressor="auto", patches=()):
+    import downloader
+    import requests
+
+    filename = f"linux-{version}.tar.xz"
+    dirname = f"linux-{version}"
+    if os.path.exists(dirname):
+        print(f"{colors.GREEN}Kernel already extracted to {dirname}. Skipping extraction.{colors.END}")
+        return True
+    try:
+        source_cache = cache.SourceCache()
+        local = os.path.exists(filename) or source_cache.lookup(filename)
+    except OSError as e:
+        print(f"{colors.RED}Cannot use the source cache {cache.cache_dir()} ({e}).{colors.END}")
+        return False
+    if local:
+        # Nothing left to overlap with, the tarball is already local
+        return download_kernel(version, debug) and extract_kernel(version, debug, decompressor, patches)
+
+    base_url = f"{KERNEL_BASE_URL}/pub/linux/kernel/v{version.split('.')[0]}.x"
+    url = f"{base_url}/{filename}"
+
+    try:
+        with extractor.Staging() as staging:
+            def download(destination):
+                if debug:
+                    print(f"{colors.CYAN}Streaming {url} into {dirname}{colors.END}")
+                response = requests.get(url, stream=True, timeout=downloader.TIMEOUT)
+                if response.status_code != 200:
+                    response.close()
+                    raise downloader.DownloadError(f"HTTP {response.status_code} for {url}")
+                try:
+                    with progress.bar("Downloading and extracting") as bar:
+                        downloader.count_received(extractor.extract_response(response, destination, staging.path, bar.update))
+                except Exception:
+                    os.remove(destination)
+                    raise
+
+            cached_path, hit = source_cache.fetch(version, filename, download, sums_url=f"{base_url}/sha256sums.asc", debug=debug)
+            # Only a tarball that passed the checksum gets its tree moved into place
+            staging.commit()
+        cache.link_into(cached_path, filename)
+    except (requests.RequestException, downloader.DownloadError, cache.CacheError) as e:
+        print(f"{colors.RED}Failed to download kernel ({e}). Nothing was extracted.{colors.END}")
+        return False
+    except (OSError, EOFError, tarfile.TarError, lzma.LZMAError, extractor.ExtractError) as e:
+        print(f"{colors.RED}Failed to extract {filename}: {e}{colors.END}")
+        return False
+    if hit:
+        # Another process downloaded it while this one waited, extract from the cache
+        return extract_kernel(version, debug, decompressor, patches)
+    print(f"Downloaded and extracted {dirname}")
+    try:
+        farm.adopt(filename, version, dirname, debug)
+    except OSError as e:
+        print(f"{colors.YELLOW}Could not add {dirname} to the tree farm: {e}{colors.END}")
+    return True
+
+
+def choose_patch_files(debug=False):
+    apply_patch = input(f"{colors.YELLOW}Do you have a patch file to apply? (y/n): {colors.END}").strip().lower()
+    if apply_patch not in ('y', 'yes'):
+        return []
+    patch_in_current_dir = input(f"{colors.YELLOW}Is the patch file in the current directory? (y/n): {colors.END}").strip().lower()
+    if patch_in_current_dir in ('y', 'yes'):
+        patch_dir = '.'
+    else:
+        patch_dir = input(f"{colors.YELLOW}Enter the directory or series file listing the patches: {colors.END}").strip()
+    # A series file sets the order, otherwise every patch is applied in name order
+    try:
+        patch_files = series.load_series(patch_dir)
+    except series.SeriesError as e:
+        print(f"{colors.RED}{e}{colors.END}")
+        return None
+    if not patch_files:
+        print(f"{colors.RED}No patch files found in {patch_dir}.{colors.END}")
+        return None
+    if debug:
+        print(f"{colors.CYAN}Patch series: {', '.join(os.path.basename(patch) for patch in patch_files)}{colors.END}")
+    return patch_files
+
+def apply_patch(version, debug=False, patch_files=None):
+    if patch_files is None:
+        patch_files = choose_patch_files(debug)
+        if patch_files is None:
+            return False
+
+    # Patches are applied inside the extracted kernel directory
+    kernel_dir = f"linux-{version}"
+    if not os.path.isdir(kernel_dir):
+        print(f"{colors.RED}Kernel directory {kernel_dir} not found.{colors.END}")
+        return False
+
+    try:
+        applied = series.apply_series(kernel_dir, patch_files, series.series_key(f"{kernel_dir}.tar.xz", patch_files), debug)
+    except (OSError, series.SeriesError) as e:
+        print(f"{colors.RED}Patch series not applied, {kernel_dir} is unchanged: {e}{colors.END}")
+        return False
+    if applied:
+        print(f"{colors.GREEN}Applied {applied} patches.{colors.END}")
+    elif patch_files:
+        print(f"{colors.GREEN}{kernel_dir} already carries this patch series.{colors.END}")
+    return True
+
+def print_progress_bar(iteration, total, prefix='', suffix='', decimals=1, length=100, fill='█'):
+    # Kept for bench_extract.py's baseline, the build itself uses progress.py
+    if not total:
+        print(f'\r{prefix} {iteration} {suffix}', end='\r')
+        return
+    percent = ("{0:." + str(decimals) + "f}").format(100 * (iteration / float(total)))
+    filled_length = int(length * iteration // total)
+    bar = fill * filled_length + '-' * (length - filled_length)
+    print(f'\r{prefix} |{bar}| {percent}% {suffix}', end='\r')
+    if iteration == total:
+        print()
+
+def report_trim(base_modules, modules):
+    print(f"{colors.CYAN}Modules: {base_modules} in the base config, {modules} after trimming ({base_modules - modules} dropped){colors.END}")
+
+def configure_kernel(version, debug=False, config_source=None, config_file=None, fragments=(), disable_keyrings=None, trim=None, default_config="running", sudo=False):
+    srctree = f"linux-{version}"
+    prefix = ["sudo"] if sudo else []
+    if config_source is not None:
+        if debug:
+            print(f"{colors.CYAN}Configuring from {config_source} with fragments {', '.join(fragments) or 'none'}{colors.END}")
+        try:
+            base_modules, modules = kconfig.configure(srctree, config_source, config_file, fragments, bool(disable_keyrings), trim, sudo)
+        except (OSError, kconfig.ConfigError) as e:
+            print(f"{colors.RED}Kernel configuration failed: {e}{colors.END}")
+            return False
+        print(f"{colors.GREEN}Kernel configured from {config_source}{colors.END}")
+        if trim:
+            report_trim(base_modules, modules)
+        return True
+
+    print(f"{colors.PURPLE}Configuration options:{colors.END}")
+    print(f"{colors.BOLD}1.{colors.END} Use default configuration ({default_config})")
+    print(f"{colors.BOLD}2.{colors.END} Choose configuration from scratch")
+    print(f"{colors.BOLD}3.{colors.END} Customize from default configuration")
+    while True:
+        config_option = input(f"{colors.YELLOW}Enter your choice (1/2/3): {colors.END}")
+        if config_option in ('1', '2', '3'):
+            break
+        print(f"{colors.RED}Invalid selection. Please enter 1, 2, or 3.{colors.END}")
+    try:
+        if config_option in ('1', '3'):
+            if debug:
+                print(f"{colors.CYAN}Writing the {default_config} configuration{colors.END}")
+            kconfig.write_base_config(srctree, default_config, sudo=sudo)
+            if trim:
+                if debug:
+                    print(f"{colors.CYAN}Trimming to the modules in {'lsmod' if trim == kconfig.TRIM_LOADED else trim}{colors.END}")
+                base_modules = kconfig.count_modules(os.path.join(srctree, ".config"))
+                kconfig.trim_modules(srctree, trim, sudo)
+                report_trim(base_modules, kconfig.count_modules(os.path.join(srctree, ".config")))
+        if config_option in ('2', '3'):
+            if debug:
+                print(f"{colors.CYAN}Running 'make menuconfig'{colors.END}")
+            if subprocess.run([*prefix, "make", "menuconfig"], cwd=srctree).returncode != 0:
+                raise kconfig.ConfigError("make menuconfig failed")
+    except (OSError, kconfig.ConfigError) as e:
+        print(f"{colors.RED}Kernel configuration failed: {e}{colors.END}")
+        return False
+    print(f"{colors.GREEN}Kernel configuration completed{colors.END}")
+
+    # Optionally disable secure boot keyrings
+    if disable_keyrings is None:
+        disable_secureboot = input(f"{colors.YELLOW}Do you want to disable secure boot keyrings? (y/n): {colors.END}").strip().lower()
+        disable_keyrings = disable_secureboot in ('y', 'yes')
+    if disable_keyrings:
+        print(f"{colors.CYAN}Disabling secure boot keyrings{colors.END}")
+        try:
+            kconfig.disable_keyrings(srctree, sudo)
+        except kconfig.ConfigError as e:
+            print(f"{colors.RED}{e}{colors.END}")
+            return False
+        print(f"{colors.GREEN}Secure boot keyrings disabled{colors.END}")
+    return True
+
+def compile_kernel(version, debug=False, incremental=False, compiler_cache="none", compiler_cache_size=builder.DEFAULT_COMPILER_CACHE_SIZE, max_jobs=None, max_load=None, profile_dir=None, profile_top=profiler.DEFAULT_TOP, sudo=False):
+    srctree = f"linux-{version}"
+    objdir = None
+    try:
+        if incremental:
+            objdir = builder.prepare_build_dir(srctree, version, sudo=sudo, debug=debug)
+        launcher = builder.choose_compiler_cache(compiler_cache)
+    except (builder.BuildError, subprocess.CalledProcessError) as e:
+        print(f"{colors.RED}Cannot prepare the build: {e}{colors.END}")
+        return False
+    profile = profiler.prepare() if profile_dir else None
+    try:
+        if profile:
+            _, wrapper, log = profile
+            make = ["make", *builder.make_args(objdir), *builder.compiler_args(launcher, profiler.wrapper_command(wrapper, log, "cc")), *profiler.linker_args(wrapper, log)]
+        else:
+            make = ["make", *builder.make_args(objdir), *builder.compiler_args(launcher)]
+        env = builder.compiler_cache_env(launcher, srctree, compiler_cache_size)
+        if launcher:
+            builder.zero_stats(launcher, env, sudo)
+
+        print(f"{colors.CYAN}Compiling kernel{colors.END}")
+        utilization = jobs.Utilization()
+        for phase in jobs.PHASES:
+            job_count, load = jobs.plan(phase, max_jobs, max_load)
+            if debug:
+                print(f"{colors.CYAN}Running '{'sudo ' if sudo else ''}{' '.join(make)} {' '.join(jobs.make_args(job_count, load))} {phase}'{colors.END}")
+            command, command_env = builder.env_command([*make, *jobs.make_args(job_count, load), phase], env, sudo)
+            if runner.run(command, cwd=srctree, env=command_env) != 0:
+                print(f"{colors.RED}Kernel compilation failed in the {phase} phase{colors.END}")
+                return False
+        print(f"{colors.GREEN}Kernel compilation completed{colors.END}")
+        print(f"{colors.CYAN}{utilization.summary()}{colors.END}")
+        if launcher:
+            stats = builder.cache_stats(launcher, env, sudo)
+            if stats:
+                print(f"{colors.CYAN}{launcher}: {builder.format_hit_rate(stats)}{colors.END}")
+        return True
+    finally:
+        # A failed build is profiled too, it shows how far the build got
+        if profile:
+            try:
+                print(profiler.write_results(profile[2], profile_dir, profile_top))
+                print(f"{colors.CYAN}Compile profile written to {profile_dir} ({profiler.REPORT_FILE}, {profiler.TRACE_FILE}){colors.END}")
+            except OSError as e:
+                print(f"{colors.RED}Cannot write the compile profile: {e}{colors.END}")
+            profiler.cleanup(profile[0])
+
+def kernel_image(version):
+    srctree = f"linux-{version}"
+    return os.path.join(builder.object_dir(srctree) or srctree, "arch/x86/boot/bzImage")
+
+def kernel_release(version):
+    # Modules and initramfs are named after the release, which includes any CONFIG_LOCALVERSION
+    srctree = f"linux-{version}"
+    try:
+        with open(os.path.join(builder.object_dir(srctree) or srctree, "include/config/kernel.release")) as release:
+            return release.read().strip() or version
+    except OSError:
+        return version
+
+def install_compressed_modules(version, compressor, make, steps, debug=False, sudo=False):
+    # Install into a staging directory with kbuild's serial compression
+    # turned off, compress there on every CPU, then copy into place
+    srctree = f"linux-{version}"
+    release = kernel_release(version)
+    prefix = ["sudo"] if sudo else []
+    staging = tempfile.mkdtemp(prefix=".modules-", dir=os.path.dirname(os.path.abspath(srctree)))
+    try:
+        command = [*prefix, *make, f"INSTALL_MOD_PATH={staging}", "CONFIG_MODULE_COMPRESS_GZIP=", "CONFIG_MODULE_COMPRESS_XZ=", "CONFIG_MODULE_COMPRESS_ZSTD=", "modules_install"]
+        if debug:
+            print(f"{colors.CYAN}Running '{' '.join(command)}'{colors.END}")
+        start = time.monotonic()
+        if runner.run(command, cwd=srctree) != 0:
+            print(f"{colors.RED}make modules_install failed{colors.END}")
+            return False
+        steps.append(("modules_install", time.monotonic() - start))
+
+        moddir = next(iter(glob.glob(os.path.join(staging, "lib", "modules", release)) + glob.glob(os.path.join(staging, "usr", "lib", "modules", release))), None)
+        if not moddir:
+            print(f"{colors.RED}make modules_install did not create modules for {release}{colors.END}")
+            return False
+        thread_count = compress.threads()
+        size = compress.tree_size(moddir)
+        start = time.monotonic()
+        try:
+            count = compress.compress_modules(moddir, compressor, thread_count, sudo)
+        except compress.CompressionError as e:
+            print(f"{colors.RED}Module compression failed: {e}{colors.END}")
+            return False
+        steps.append((f"compress ({compressor}, {thread_count} threads)", time.monotonic() - start))
+        print(f"{colors.CYAN}{count} modules: {cache.format_size(size)} -> {cache.format_size(compress.tree_size(moddir))}{colors.END}")
+
+        target = os.path.join("/", os.path.relpath(moddir, staging))
+        start = time.monotonic()
+        for command in (["rm", "-rf", target], ["mkdir", "-p", os.path.dirname(target)], ["cp", "-a", moddir, target], ["depmod", "-a", release]):
+            if runner.run(["sudo", *command]) != 0:
+                print(f"{colors.RED}'{' '.join(command)}' failed{colors.END}")
+                return False
+        steps.append(("copy and depmod", time.monotonic() - start))
+        return True
+    finally:
+        subprocess.run([*prefix, "rm", "-rf", staging])
+
+def report_initramfs(image, compressor=None, seconds=None):
+    if not os.path.exists(image):
+        return
+    details = [cache.format_size(os.path.getsize(image))]
+    if compressor:
+        details.append(f"{compressor} on {compress.threads()} threads")
+    if seconds is not None:
+        details.append(f"{seconds:.1f}s")
+    print(f"{colors.CYAN}Initramfs {image}: {', '.join(details)}{colors.END}")
+
+def install_kernel(version, debug=False, compression="auto", sudo=False):
+    srctree = f"linux-{version}"
+    objdir = builder.object_dir(srctree)
+    make = ["make", *builder.make_args(objdir)]
+    try:
+        compressor = compress.module_compressor(compression, os.path.join(objdir or srctree, ".config"))
+    except compress.CompressionError as e:
+        print(f"{colors.RED}Cannot compress modules: {e}{colors.END}")
+        return False
+    print(f"{colors.CYAN}Installing kernel{colors.END}")
+    steps = []
+    if compressor:
+        if not install_compressed_modules(version, compressor, make, steps, debug, sudo):
+            return False
+        targets = ("install",)
+    else:
+        targets = ("modules_install", "install")
+    for target in targets:
+        if debug:
+            print(f"{colors.CYAN}Running 'sudo {' '.join(make)} {target}'{colors.END}")
+        start = time.monotonic()
+        if runner.run(["sudo", *make, target], cwd=srctree) != 0:
+            print(f"{colors.RED}make {target} failed{colors.END}")
+            return False
+        steps.append((target, time.monotonic() - start))
+    print(f"{colors.GREEN}Kernel installation completed{colors.END}")
+    print(f"{colors.CYAN}{', '.join(f'{label} {seconds:.1f}s' for label, seconds in steps)}{colors.END}")
+    if os.path.exists(kernel_image(version)):
+        print(f"{colors.CYAN}Kernel image: {cache.format_size(os.path.getsize(kernel_image(version)))}{colors.END}")
+    return True
+
+def package_kernel(version, target, patterns, output_dir, debug=False, sudo=False, max_jobs=None, max_load=None):
+    srctree = f"linux-{version}"
+    objdir = builder.object_dir(srctree)
+    objtree = os.path.abspath(objdir or srctree)
+    prefix = ["sudo"] if sudo else []
+    job_count, load = jobs.plan("all", max_jobs, max_load)
+    make = [*prefix, "make", *builder.make_args(objdir), *jobs.make_args(job_count, load), target]
+    print(f"{colors.CYAN}Building kernel packages with 'make {target}'{colors.END}")
+    if debug:
+        print(f"{colors.CYAN}Running '{' '.join(make)}'{colors.END}")
+    # kbuild drops packages next to or inside the object tree depending on
+    # the format, so collect whatever matching file this run created or rewrote
+    def snapshot():
+        return {path: os.path.getmtime(path) for pattern in patterns for path in glob.glob(os.path.join(objtree, pattern))}
+
+    before = snapshot()
+    if runner.run(make, cwd=srctree) != 0:
+        print(f"{colors.RED}make {target} failed{colors.END}")
+        return []
+
+    os.makedirs(output_dir, exist_ok=True)
+    built = []
+    for path, mtime in snapshot().items():
+        if before.get(path) != mtime:
+            destination = os.path.join(output_dir, os.path.basename(path))
+            shutil.move(path, destination)
+            built.append(destination)
+    if not built:
+        print(f"{colors.RED}make {target} finished but produced no package{colors.END}")
+        return []
+    for path in built:
+        print(f"{colors.GREEN}Built {path}{colors.END}")
+    return built
+
+def package_release(path, list_command):
+    # Every kernel image package ships /lib/modules/<release>/ or /usr/lib/modules/<release>/
+    result = subprocess.run([*list_command, path], capture_output=True, text=True)
+    match = re.search(r'lib/modules/([^/\s]+)/', result.stdout)
+    return match.group(1) if match else None
+
+def deploy_packages(paths, install_command, list_command, debug=False):
+    paths = [os.path.abspath(path) for path in paths]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        print(f"{colors.RED}Package not found: {', '.join(missing)}{colors.END}")
+        return None
+    release = next(filter(None, (package_release(path, list_command) for path in paths)), None)
+    if not release:
+        print(f"{colors.RED}None of the packages contains a kernel{colors.END}")
+        return None
+    print(f"{colors.CYAN}Installing kernel {release}{colors.END}")
+    if debug:
+        print(f"{colors.CYAN}Running '{' '.join(install_command + paths)}'{colors.END}")
+    if runner.run([*install_command, *paths]) != 0:
+        print(f"{colors.RED}Package installation failed{colors.END}")
+        return None
+    print(f"{colors.GREEN}Kernel {release} installed{colors.END}")
+    return release
+
+
+class Backend:
+    # Everything distro independent runs here; the plugin module only
+    # supplies packages, initramfs and bootloader handling
+    def __init__(self, name, plugin):
+        self.name = name
+        self.plugin = plugin
+        self.sudo = getattr(plugin, "BUILD_WITH_SUDO", False)
+
+    get_available_versions = staticmethod(get_available_versions)
+    choose_kernel_version = staticmethod(choose_kernel_version)
+    download_kernel = staticmethod(download_kernel)
+    extract_kernel = staticmethod(extract_kernel)
+    fetch_and_extract_kernel = staticmethod(fetch_and_extract_kernel)
+    choose_patch_files = staticmethod(choose_patch_files)
+    apply_patch = staticmethod(apply_patch)
+
+    def install_packages(self, debug, assume_yes=False):
+        return self.plugin.install_packages(debug, assume_yes)
+
+    def configure_kernel(self, version, debug=False, config_source=None, config_file=None, fragments=(), disable_keyrings=None, trim=None):
+        return configure_kernel(version, debug, config_source, config_file, fragments, disable_keyrings, trim, self.plugin.DEFAULT_CONFIG, self.sudo)
+
+    def compile_kernel(self, version, debug=False, incremental=False, compiler_cache="none", compiler_cache_size=builder.DEFAULT_COMPILER_CACHE_SIZE, max_jobs=None, max_load=None, profile_dir=None, profile_top=profiler.DEFAULT_TOP):
+        return compile_kernel(version, debug, incremental, compiler_cache, compiler_cache_size, max_jobs, max_load, profile_dir, profile_top, self.sudo)
+
+    def install_kernel(self, version, debug=False, compression="auto"):
+        if not install_kernel(version, debug, compression, self.sudo):
+            return False
+        post_install = getattr(self.plugin, "post_install", None)
+        return post_install(version, kernel_image(version), debug) if post_install else True
+
+    def package_kernel(self, version, debug=False, output_dir="packages", max_jobs=None, max_load=None):
+        return package_kernel(version, self.plugin.PACKAGE_TARGET, self.plugin.PACKAGE_FILES, output_dir, debug, self.sudo, max_jobs, max_load)
+
+    def deploy(self, paths, debug=False, initramfs=True, bootloader=True):
+        # Installs prebuilt packages, no source tree or compiler involved
+        release = deploy_packages(paths, self.plugin.PACKAGE_INSTALL, self.plugin.PACKAGE_LIST, debug)
+        if not release:
+            return False
+        if initramfs and not self.create_initramfs(release, debug):
+            return False
+        return self.update_bootloader(release, debug) if bootloader else True
+
+    def create_initramfs(self, version, debug=False, compression="auto"):
+        return self.plugin.create_initramfs(kernel_release(version), debug, compression)
+
+    def update_bootloader(self, version, debug=False):
+        return self.plugin.update_bootloader(kernel_release(version) if version else None, debug)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+import lzma
+import os
+import queue
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+
+READ_SIZE = 1024 * 1024
+REFRESH_RATE = 10
+STREAM_QUEUE_DEPTH = 64
+
+# External decompressors, tried in order, that can use every core
+EXTERNAL_BACKENDS = {
+    "pixz": ["pixz", "-d"],
+    "xz": ["xz", "-d", "-c", "-T0"],
+}
+CHOICES = ("auto", "python", *EXTERNAL_BACKENDS)
+
+
+class ExtractError(Exception):
+    pass
+
+
+class CountingReader:
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.count += len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+class StreamReader:
+    # Pulls an HTTP response on a background thread, writing every chunk to
+    # tee_file while the caller decompresses what has already arrived
+    def __init__(self, response, tee_file, chunk_size=READ_SIZE):
+        self.response = response
+        self.tee_file = tee_file
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.received = 0
+        self.current = b""
+        self.position = 0
+        self.finished = False
+        self.chunks = queue.Queue(maxsize=STREAM_QUEUE_DEPTH)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._pump, daemon=True)
+        self.thread.start()
+
+    def _pump(self):
+        try:
+            for chunk in self.response.iter_content(chunk_size=self.chunk_size):
+                if self.stopped.is_set():
+                    return
+                self.tee_file.write(chunk)
+                self.received += len(chunk)
+                self.chunks.put(chunk)
+            self.chunks.put(None)
+        except Exception as e:
+            self.chunks.put(e)
+
+    def read(self, size=-1):
+        parts = []
+        while size != 0:
+            if self.position >= len(self.current):
+                if self.finished:
+                    break
+                chunk = self.chunks.get()
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if chunk is None:
+                    self.finished = True
+                    break
+                self.current, self.position = chunk, 0
+                continue
+            end = len(self.current) if size < 0 else min(len(self.current), self.position + size)
+            parts.append(self.current[self.position:end])
+            if size > 0:
+                size -= end - self.position
+            self.position = end
+        data = b"".join(parts)
+        self.count += len(data)
+        return data
+
+    def drain(self):
+        # The tar reader can stop before the trailing padding; keep teeing it
+        while self.read(READ_SIZE):
+            pass
+        self.thread.join()
+
+    def close(self):
+        self.stopped.set()
+        self.response.close()
+        while self.thread.is_alive():
+            try:
+                self.chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+class Staging:
+    # Extract next to dest and only move the tree into place on commit(), so
+    # a failed extraction never leaves a linux-<version> directory behind
+    def __init__(self, dest="."):
+        self.dest = dest
+        self.path = tempfile.mkdtemp(prefix=".extract-", dir=dest)
+
+    def commit(self):
+        for name in os.listdir(self.path):
+            target = os.path.join(self.dest, name)
+            if os.path.lexists(target):
+                raise ExtractError(f"{target} already exists")
+            os.rename(os.path.join(self.path, name), target)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def choose_backend(preference="auto"):
+    if preference == "python":
+        return "python"
+    if preference != "auto":
+        if preference not in EXTERNAL_BACKENDS or not shutil.which(EXTERNAL_BACKENDS[preference][0]):
+            raise ExtractError(f"Decompressor {preference} is not available")
+        return preference
+    for name, command in EXTERNAL_BACKENDS.items():
+        if shutil.which(command[0]):
+            return name
+    return "python"
+
+
+def throttled(progress, total, refresh_rate=REFRESH_RATE):
+    interval = 1.0 / refresh_rate
+    last = [0.0, None]
+
+    def update(done, force=False):
+        done = min(done, total)
+        now = time.monotonic()
+        if progress and done != last[1] and (force or now - last[0] >= interval):
+            last[0], last[1] = now, done
+            progress(done, total)
+
+    return update
+
+
+def tar_filter():
+    # Python 3.12+ (and security backports) want an explicit extraction filter
+    return {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+
+
+def extract_stream(decompressed, counter, total, dest, update):
+    def members(tar):
+        for member in tar:
+            update(counter.count)
+            yield member
+
+    # Stream mode reads the archive once; extractall defers directory
+    # permissions and mtimes to a single pass at the end
+    with tarfile.open(fileobj=decompressed, mode="r|") as tar:
+        tar.extractall(dest, members=members(tar), **tar_filter())
+    update(total, force=True)
+
+
+def extract_python(archive, dest, update, total):
+    with open(archive, "rb") as raw:
+        counter = CountingReader(raw)
+        with lzma.open(counter) as decompressed:
+            extract_stream(decompressed, counter, total, dest, update)
+
+
+def extract_external(archive, dest, update, total, backend):
+    process = subprocess.Popen(EXTERNAL_BACKENDS[backend], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    counter = CountingReader(open(archive, "rb"))
+
+    def feed():
+        try:
+            for chunk in iter(lambda: counter.read(READ_SIZE), b""):
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        finally:
+            counter.close()
+            process.stdin.close()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        extract_stream(process.stdout, counter, total, dest, update)
+    finally:
+        process.stdout.close()
+        feeder.join()
+        returncode = process.wait()
+    if returncode != 0:
+        raise ExtractError(f"{backend} exited with status {returncode}")
+
+
+def extract_archive(archive, dest=".", progress=None, backend="auto", refresh_rate=REFRESH_RATE):
+    total = os.path.getsize(archive)
+    update = throttled(progress, total, refresh_rate)
+    backend = choose_backend(backend)
+    with Staging(dest) as staging:
+        if backend == "python":
+            extract_python(archive, staging.path, update, total)
+        else:
+            extract_external(archive, staging.path, update, total, backend)
+        staging.commit()
+    return backend
+
+
+def extract_response(response, tee_path, dest, progress=None, refresh_rate=REFRESH_RATE):
+    total = int(response.headers.get("content-length") or 0)
+    update = throttled(progress if total else None, total, refresh_rate)
+    with open(tee_path, "wb") as tee_file:
+        reader = StreamReader(response, tee_file)
+        try:
+            with lzma.open(reader) as decompressed:
+                extract_stream(decompressed, reader, total, dest, update)
+            reader.drain()
+        finally:
+            reader.close()
+    if total and reader.received != total:
+        raise ExtractError(f"Short read: got {reader.received} of {total} bytes")
+    return reader.received
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import errno
+import fcntl
+import os
+import shutil
+import subprocess
+import tempfile
+
+import cache
+
+# Pristine extracted trees kept in the cache, least recently used go first
+MAX_SOURCES = 3
+
+
+def enabled():
+    return os.environ.get("KERNEL_BUILDER_TREE_FARM", "1") != "0"
+
+
+def sources_dir():
+    return os.path.join(cache.cache_dir(), "sources")
+
+
+def pristine_path(tarball, version):
+    return os.path.join(sources_dir(), cache.cached_sha256(tarball)[:16], f"linux-{version}")
+
+
+def lock(directory, blocking=True):
+    # One lock per tarball, kept next to its directory so eviction can remove
+    # both. A lock won on a file eviction has just deleted is taken again.
+    path = f"{directory}.lock"
+    while True:
+        lock_file = open(path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        try:
+            if os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                return lock_file
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+
+
+def clone_method(source_dir, destination_dir):
+    # Reflinks (btrfs, xfs) are real copy-on-write clones; hard links share
+    # the files themselves and only work within one filesystem
+    with tempfile.NamedTemporaryFile(dir=source_dir) as probe:
+        target = os.path.join(destination_dir, f".clone-probe-{os.getpid()}")
+        try:
+            with open(target, "wb") as clone:
+                fcntl.ioctl(clone.fileno(), cache.FICLONE, probe.fileno())
+            return "reflink"
+        except OSError:
+            pass
+        finally:
+            if os.path.exists(target):
+                os.remove(target)
+        try:
+            os.link(probe.name, target)
+            os.remove(target)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOTSUP):
+                raise
+    return None
+
+
+def clone_tree(source, destination, method=None):
+    method = method or clone_method(os.path.dirname(os.path.abspath(source)), os.path.dirname(os.path.abspath(destination)))
+    if not method:
+        return None
+    if method == "reflink":
+        # Pristine trees are read-only, a reflinked copy is private and can be writable
+        command = ["cp", "-a", "--reflink=always", source, destination]
+    else:
+        command = ["cp", "-al", source, destination]
+    if subprocess.run(command, stderr=subprocess.DEVNULL).returncode != 0:
+        shutil.rmtree(destination, ignore_errors=True)
+        return None
+    if method == "reflink":
+        subprocess.run(["chmod", "-R", "u+w", destination])
+    return method
+
+
+def protect(root):
+    # Hard linked clones share these files; read-only keeps an editor from
+    # writing through a link into the pristine tree, patch still replaces them
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if not os.path.islink(path):
+                os.chmod(path, os.stat(path).st_mode & ~0o222)
+
+
+def evict(max_sources=MAX_SOURCES, keep=()):
+    try:
+        names = os.listdir(sources_dir())
+    except OSError:
+        return
+    names = [name for name in names if not name.endswith(".lock")]
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(sources_dir(), name)), reverse=True)
+    for name in names[max_sources:]:
+        if name in keep:
+            continue
+        # A tree another process is extracting or cloning stays for now
+        path = os.path.join(sources_dir(), name)
+        held = lock(path, blocking=False)
+        if held:
+            with held:
+                shutil.rmtree(path, ignore_errors=True)
+                os.remove(f"{path}.lock")
+
+
+def checkout(tarball, version, destination, extract, debug=False):
+    # Returns how the working tree was made, or None when the farm cannot be
+    # used and the caller has to extract it itself
+    if not enabled() or not os.path.isfile(tarball):
+        return None
+    os.makedirs(sources_dir(), exist_ok=True)
+    method = clone_method(sources_dir(), os.path.dirname(os.path.abspath(destination)))
+    if not method:
+        if debug:
+            print(f"{sources_dir()} is on another filesystem, extracting without the tree farm")
+        return None
+    pristine = pristine_path(tarball, version)
+    with lock(os.path.dirname(pristine)):
+        # Checked again under the lock, another build may have just extracted it
+        if not os.path.isdir(pristine):
+            os.makedirs(os.path.dirname(pristine), exist_ok=True)
+            extract(os.path.dirname(pristine))
+            protect(pristine)
+        elif debug:
+            print(f"Cloning the pristine tree {pristine}")
+        os.utime(os.path.dirname(pristine))
+        method = clone_tree(pristine, destination, method)
+    evict(keep={os.path.basename(os.path.dirname(pristine))})
+    return method
+
+
+def adopt(tarball, version, srctree, debug=False):
+    # A tree extracted while downloading becomes the pristine tree as long as
+    # it is still untouched
+    if not enabled() or not os.path.isfile(tarball):
+        return
+    pristine = pristine_path(tarball, version)
+    os.makedirs(sources_dir(), exist_ok=True)
+    with lock(os.path.dirname(pristine)):
+        if os.path.isdir(pristine):
+            return
+        os.makedirs(os.path.dirname(pristine), exist_ok=True)
+        # Cloned under a temporary name so an interrupted copy is never taken for a tree
+        tmp = f"{pristine}.{os.getpid()}.tmp"
+        if not clone_tree(srctree, tmp):
+            if debug:
+                print(f"Cannot clone {srctree} into {sources_dir()}, not adding it to the tree farm")
+            return
+        protect(tmp)
+        os.rename(tmp, pristine)
+    evict(keep={os.path.basename(os.path.dirname(pristine))})
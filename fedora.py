@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import time
+
+import bootloader
+import compress
+import packages
+import runner
+from engine import colors, report_initramfs
+
+# Fedora and the RHEL family (CentOS Stream, Rocky, Alma, ...)
+DEFAULT_CONFIG = "running"
+BUILD_WITH_SUDO = False
+
+PACKAGE_TARGET = "binrpm-pkg"
+PACKAGE_FILES = ("rpmbuild/RPMS/*/*.rpm",)
+PACKAGE_INSTALL = ["sudo", "dnf", "install"]
+PACKAGE_LIST = ["rpm", "-qlp"]
+
+PACKAGES = [
+    "gcc",
+    "make",
+    "bison",
+    "flex",
+    "bc",
+    "perl",
+    "openssl-devel",
+    "elfutils-libelf-devel",
+    "ncurses-devel",
+    "dwarves",
+    "xz"
+]
+
+def install_packages(debug, assume_yes=False):
+    return packages.ensure_packages("dnf", PACKAGES, debug, assume_yes)
+
+def create_initramfs(version, debug=False, compression="auto"):
+    # make install runs installkernel, which calls kernel-install and dracut;
+    # only rebuild when a specific compressor is asked for
+    image = f"/boot/initramfs-{version}.img"
+    if compression == "auto":
+        report_initramfs(image)
+        return True
+    try:
+        compressor = compress.initramfs_compressor(compression)
+    except compress.CompressionError as e:
+        print(f"{colors.RED}Cannot compress initramfs: {e}{colors.END}")
+        return False
+    # dracut runs the --compress argument as the compressor command line
+    method = ["--compress", " ".join([compressor, *compress.initramfs_options(compressor)])] if compressor else ["--no-compress"]
+    command = ["sudo", "dracut", "--force", *method, image, version]
+    print(f"{colors.CYAN}Creating initramfs{colors.END}")
+    if debug:
+        print(f"{colors.CYAN}Running '{' '.join(command)}'{colors.END}")
+    start = time.monotonic()
+    if runner.run(command) != 0:
+        print(f"{colors.RED}Initramfs creation failed{colors.END}")
+        return False
+    print(f"{colors.GREEN}Initramfs creation completed{colors.END}")
+    report_initramfs(image, compressor, time.monotonic() - start)
+    return True
+
+def regenerate_bootloader(loader):
+    print(f"{colors.CYAN}Updating bootloader{colors.END}")
+    if runner.run(["sudo", "grub2-mkconfig", "-o", "/boot/grub2/grub.cfg"]) != 0:
+        print(f"{colors.RED}Bootloader update failed{colors.END}")
+        return False
+    print(f"{colors.GREEN}Bootloader updated{colors.END}")
+    return True
+
+def update_bootloader(version, debug=False):
+    # Fedora boots from BLS entries, which kernel-install normally writes;
+    # grub.cfg is only regenerated on systems without them
+    return bootloader.update(version, regenerate_bootloader, debug=debug)
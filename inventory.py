@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import glob
+import hashlib
+import json
+import os
+import platform
+import re
+import struct
+
+import cache
+
+INDEX_VERSION = 1
+IMAGE_PATTERN = re.compile(r'^(?:vmlinuz|vmlinux|bzImage)-(.+)$')
+INITRAMFS_PATTERN = re.compile(r'^(?:initrd\.img-(.+)|initramfs-(.+?)\.img|initrd-(.+?)(?:\.img)?)$')
+MODULE_PATTERN = re.compile(r'\.ko(?:\.(?:zst|xz|gz))?$')
+MODULE_DIRS = ("lib/modules", "usr/lib/modules")
+BLS_DIRS = ("boot/loader/entries", "efi/loader/entries", "boot/efi/loader/entries")
+
+
+def index_path(root="/"):
+    name = "inventory.json" if root == "/" else f"inventory-{hashlib.sha256(root.encode()).hexdigest()[:12]}.json"
+    return os.path.join(cache.cache_dir(), name)
+
+
+def image_release(path):
+    # x86 bzImage headers point at the kernel version string, which is the
+    # real release even when the file is called vmlinuz-linux
+    try:
+        with open(path, "rb") as image:
+            header = image.read(0x210)
+            if len(header) < 0x210 or header[0x202:0x206] != b"HdrS":
+                return None
+            offset = struct.unpack_from("<H", header, 0x20E)[0]
+            if not offset:
+                return None
+            image.seek(offset + 0x200)
+            text = image.read(256).split(b"\0", 1)[0].decode("ascii", "replace")
+    except OSError:
+        return None
+    return text.split()[0] if text.split() else None
+
+
+def module_dirs(root="/"):
+    # Merged /usr systems have both paths pointing at one directory
+    seen = {}
+    for name in MODULE_DIRS:
+        path = os.path.join(root, name)
+        if os.path.isdir(path):
+            seen.setdefault(os.path.realpath(path), path)
+    return list(seen.values())
+
+
+def count_modules(path):
+    count = size = 0
+    for directory, dirs, files in os.walk(path):
+        # build and source point back into a kernel tree
+        dirs[:] = [name for name in dirs if not os.path.islink(os.path.join(directory, name))]
+        for name in files:
+            full = os.path.join(directory, name)
+            if os.path.islink(full):
+                continue
+            size += os.path.getsize(full)
+            if MODULE_PATTERN.search(name):
+                count += 1
+    return count, size
+
+
+def parse_bls(path):
+    fields = {}
+    with open(path) as entry:
+        for line in entry:
+            key, _, value = line.strip().partition(" ")
+            if key and not key.startswith("#"):
+                fields.setdefault(key, value.strip())
+    return fields
+
+
+def watched(root="/"):
+    # Directories whose modification time changes when a kernel is added or removed
+    paths = [os.path.join(root, "boot"), *module_dirs(root), *[os.path.join(root, name) for name in BLS_DIRS]]
+    for modules in module_dirs(root):
+        try:
+            paths += [os.path.join(modules, name) for name in os.listdir(modules)]
+        except OSError:
+            pass
+    return paths
+
+
+def stamps(paths):
+    result = {}
+    for path in paths:
+        try:
+            result[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            result[path] = None
+    return result
+
+
+def scan(root="/"):
+    kernels = {}
+
+    def kernel(release):
+        return kernels.setdefault(release, {"release": release, "image": None, "image_size": 0, "initramfs": [], "initramfs_size": 0, "modules_dir": None, "modules": 0, "modules_size": 0, "entries": []})
+
+    boot = os.path.join(root, "boot")
+    try:
+        names = sorted(os.listdir(boot))
+    except OSError:
+        # No /boot, or an ESP mounted there that only root may read
+        names = []
+    images = {}
+    for name in names:
+        match = IMAGE_PATTERN.match(name)
+        if match and not name.endswith((".old", ".sig")):
+            path = os.path.join(boot, name)
+            images[match.group(1)] = path
+            record = kernel(image_release(path) or match.group(1))
+            record["image"], record["image_size"] = path, os.path.getsize(path)
+    for modules in module_dirs(root):
+        for release in sorted(os.listdir(modules)):
+            path = os.path.join(modules, release)
+            if os.path.isdir(path) and not os.path.islink(path):
+                record = kernel(release)
+                record["modules_dir"] = path
+                record["modules"], record["modules_size"] = count_modules(path)
+
+    # Initramfs files are named after the image suffix, which is not always the release
+    suffixes = {suffix: image_release(path) or suffix for suffix, path in images.items()}
+    for name in names:
+        match = INITRAMFS_PATTERN.match(name)
+        if match:
+            suffix = next(group for group in match.groups() if group)
+            for candidate in (suffix, suffix.removesuffix("-fallback")):
+                if candidate in suffixes:
+                    suffix = suffixes[candidate]
+                    break
+                if candidate.removeprefix("linux-") in kernels:
+                    suffix = candidate.removeprefix("linux-")
+                    break
+            path = os.path.join(boot, name)
+            record = kernel(suffix)
+            record["initramfs"].append(path)
+            record["initramfs_size"] += os.path.getsize(path)
+
+    for directory in BLS_DIRS:
+        for path in sorted(glob.glob(os.path.join(root, directory, "*.conf"))):
+            try:
+                fields = parse_bls(path)
+            except OSError:
+                continue
+            linux = os.path.basename(fields.get("linux", ""))
+            match = IMAGE_PATTERN.match(linux)
+            release = fields.get("version") or (suffixes.get(match.group(1), match.group(1)) if match else None)
+            if release:
+                kernel(release)["entries"].append(path)
+    return sorted(kernels.values(), key=lambda record: release_key(record["release"]))
+
+
+def release_key(release):
+    # 6.10 sorts after 6.9
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', release)]
+
+
+def tracked_files(kernels):
+    return [path for record in kernels for path in (record["image"], *record["initramfs"], *record["entries"]) if path]
+
+
+def load_index(root="/"):
+    try:
+        with open(index_path(root)) as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION or index.get("root") != root:
+        return None
+    if stamps(index["stamps"]) != index["stamps"]:
+        return None
+    return index["kernels"]
+
+
+def save_index(kernels, root="/"):
+    index = {"version": INDEX_VERSION, "root": root, "stamps": stamps([*watched(root), *tracked_files(kernels)]), "kernels": kernels}
+    os.makedirs(cache.cache_dir(), exist_ok=True)
+    tmp = f"{index_path(root)}.{os.getpid()}.tmp"
+    with open(tmp, "w") as index_file:
+        json.dump(index, index_file)
+    os.replace(tmp, index_path(root))
+
+
+def installed_kernels(root="/", refresh=False):
+    kernels = None if refresh else load_index(root)
+    if kernels is None:
+        kernels = scan(root)
+        try:
+            save_index(kernels, root)
+        except OSError:
+            pass
+    running = platform.release() if root == "/" else None
+    for record in kernels:
+        record["running"] = record["release"] == running
+    return kernels
+
+
+def print_kernels(kernels, as_json=False):
+    if as_json:
+        print(json.dumps(kernels, indent=2))
+        return
+    if not kernels:
+        print("No kernels installed.")
+        return
+    print("Installed kernels:")
+    print(f"    {'release':<32}{'image':>11}{'initramfs':>11}{'modules':>9}{'size':>11}  boot entries")
+    for idx, record in enumerate(kernels, start=1):
+        image = cache.format_size(record["image_size"]) if record["image"] else "-"
+        initramfs = cache.format_size(record["initramfs_size"]) if record["initramfs"] else "-"
+        modules = cache.format_size(record["modules_size"]) if record["modules_dir"] else "-"
+        mark = " (running)" if record.get("running") else ""
+        print(f"{idx:>2}. {record['release']:<32}{image:>11}{initramfs:>11}{record['modules']:>9}{modules:>11}  {len(record['entries'])}{mark}")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import math
+import os
+import resource
+import time
+
+# Builds are split so each phase gets a job count sized for its memory use:
+# vmlinux ends in a large single link, modules are many small compiles
+PHASES = ("vmlinux", "modules", "all")
+MEMORY_PER_JOB = {
+    "vmlinux": 1024 ** 3,
+    "modules": 512 * 1024 ** 2,
+    "all": 512 * 1024 ** 2,
+}
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def read_first_line(path):
+    try:
+        with open(path) as source:
+            return source.readline().strip()
+    except OSError:
+        return None
+
+
+def cgroup_path():
+    # cgroup v2 lists a single "0::/path" entry for this process
+    try:
+        with open("/proc/self/cgroup") as source:
+            for line in source:
+                hierarchy, _, path = line.strip().split(":", 2)
+                if hierarchy == "0":
+                    return os.path.join(CGROUP_ROOT, path.lstrip("/"))
+    except (OSError, ValueError):
+        pass
+    return CGROUP_ROOT
+
+
+def cgroup_cpu_limit():
+    cpu_max = read_first_line(os.path.join(cgroup_path(), "cpu.max")) or read_first_line(os.path.join(CGROUP_ROOT, "cpu.max"))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return max(1, math.ceil(int(quota) / int(period)))
+        return None
+    quota = read_first_line(os.path.join(CGROUP_ROOT, "cpu", "cpu.cfs_quota_us"))
+    period = read_first_line(os.path.join(CGROUP_ROOT, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return max(1, math.ceil(int(quota) / int(period)))
+    return None
+
+
+def available_cpus():
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    return min(cpus, limit) if limit else cpus
+
+
+def cgroup_memory_available():
+    base = cgroup_path()
+    limit = read_first_line(os.path.join(base, "memory.max"))
+    if not limit or limit == "max":
+        limit = read_first_line(os.path.join(CGROUP_ROOT, "memory", "memory.limit_in_bytes"))
+        if not limit or int(limit) >= 1 << 60:
+            return None
+        usage = read_first_line(os.path.join(CGROUP_ROOT, "memory", "memory.usage_in_bytes"))
+    else:
+        usage = read_first_line(os.path.join(base, "memory.current"))
+    return max(0, int(limit) - int(usage or 0))
+
+
+def available_memory():
+    available = None
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    limit = cgroup_memory_available()
+    if available is None:
+        return limit
+    return min(available, limit) if limit is not None else available
+
+
+def plan(phase="all", jobs=None, load=None):
+    cpus = available_cpus()
+    if jobs is None:
+        jobs = cpus
+        memory = available_memory()
+        if memory is not None:
+            jobs = min(jobs, memory // MEMORY_PER_JOB.get(phase, MEMORY_PER_JOB["all"]))
+        jobs = max(1, jobs)
+    if load is None:
+        load = float(cpus)
+    return jobs, load
+
+
+def make_args(jobs, load):
+    return [f"-j{jobs}", f"-l{load:g}"]
+
+
+class Utilization:
+    def __init__(self):
+        self.start_wall = time.monotonic()
+        self.start_cpu = self.children_cpu()
+
+    @staticmethod
+    def children_cpu():
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def summary(self, cpus=None):
+        cpus = cpus or available_cpus()
+        wall = time.monotonic() - self.start_wall
+        cpu = self.children_cpu() - self.start_cpu
+        ratio = cpu / wall if wall else 0.0
+        return f"{cpu:.0f} CPU-seconds in {wall:.0f}s wall: {ratio:.2f} CPU-seconds per wall-second ({100 * ratio / cpus:.0f}% of {cpus} CPUs)"
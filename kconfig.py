@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import gzip
+import os
+import platform
+import shutil
+import subprocess
+
+import runner
+
+CONFIG_SOURCES = ("running", "localmodconfig", "defconfig", "file")
+KEYRING_OPTIONS = ("SYSTEM_TRUSTED_KEYS", "SYSTEM_REVOCATION_KEYS")
+# Trim to the modules loaded right now instead of a saved lsmod listing
+TRIM_LOADED = "loaded"
+
+
+class ConfigError(Exception):
+    pass
+
+
+def running_config():
+    # /proc/config.gz needs CONFIG_IKCONFIG_PROC, distros also ship /boot/config-*
+    if os.path.exists("/proc/config.gz"):
+        with gzip.open("/proc/config.gz", "rb") as config:
+            return config.read()
+    # Fedora keeps it next to the modules
+    for path in (f"/boot/config-{platform.release()}", f"/lib/modules/{platform.release()}/config"):
+        if os.path.exists(path):
+            with open(path, "rb") as config:
+                return config.read()
+    raise ConfigError("Running kernel configuration not found in /proc/config.gz, /boot or /lib/modules")
+
+
+def run_make(srctree, target, sudo=False, variables=()):
+    prefix = ["sudo"] if sudo else []
+    # Answer any prompt for new symbols with its default
+    answers = subprocess.Popen(["yes", ""], stdout=subprocess.PIPE)
+    try:
+        returncode = runner.run([*prefix, "make", *variables, target], cwd=srctree, stdin=answers.stdout, console="quiet")
+    finally:
+        answers.stdout.close()
+        answers.kill()
+        answers.wait()
+    if returncode != 0:
+        raise ConfigError(f"make {target} failed with status {returncode}")
+
+
+def write_base_config(srctree, source, config_file=None, sudo=False):
+    config_path = os.path.join(srctree, ".config")
+    if source == "running":
+        with open(config_path, "wb") as config:
+            config.write(running_config())
+    elif source == "file":
+        if not config_file or not os.path.exists(config_file):
+            raise ConfigError(f"Config file {config_file} not found")
+        shutil.copyfile(config_file, config_path)
+    elif source in ("localmodconfig", "defconfig"):
+        run_make(srctree, source, sudo)
+    else:
+        raise ConfigError(f"Unknown config source {source}, expected one of {', '.join(CONFIG_SOURCES)}")
+
+
+def count_modules(config_path):
+    with open(config_path) as config:
+        return sum(1 for line in config if line.rstrip().endswith("=m"))
+
+
+def trim_modules(srctree, lsmod=TRIM_LOADED, sudo=False):
+    # localmodconfig turns off every module of the current .config that is
+    # not in the lsmod listing (or a dependency of one that is)
+    variables = []
+    if lsmod != TRIM_LOADED:
+        if not os.path.exists(lsmod):
+            raise ConfigError(f"lsmod listing {lsmod} not found")
+        variables.append(f"LSMOD={os.path.abspath(lsmod)}")
+    elif not shutil.which("lsmod"):
+        raise ConfigError("lsmod is not installed, pass a saved lsmod listing instead")
+    run_make(srctree, "localmodconfig", sudo, variables)
+
+
+def merge_fragments(srctree, fragments, sudo=False):
+    if not fragments:
+        return
+    prefix = ["sudo"] if sudo else []
+    fragments = [os.path.abspath(fragment) for fragment in fragments]
+    missing = [fragment for fragment in fragments if not os.path.exists(fragment)]
+    if missing:
+        raise ConfigError(f"Config fragment not found: {', '.join(missing)}")
+    returncode = runner.run([*prefix, "scripts/kconfig/merge_config.sh", "-m", ".config", *fragments], cwd=srctree, console="quiet")
+    if returncode != 0:
+        raise ConfigError(f"merge_config.sh failed with status {returncode}")
+
+
+def disable_keyrings(srctree, sudo=False):
+    prefix = ["sudo"] if sudo else []
+    for option in KEYRING_OPTIONS:
+        for command in (["--disable", option], ["--set-str", f"CONFIG_{option}", ""]):
+            if runner.run([*prefix, "scripts/config", *command], cwd=srctree) != 0:
+                raise ConfigError(f"scripts/config {' '.join(command)} failed")
+
+
+def configure(srctree, source, config_file=None, fragments=(), keyrings=False, trim=None, sudo=False):
+    # Returns the number of modules in the base config and in the result
+    config_path = os.path.join(srctree, ".config")
+    write_base_config(srctree, source, config_file, sudo)
+    base_modules = count_modules(config_path)
+    # Trim before merging, so fragments can still turn modules back on
+    if trim:
+        trim_modules(srctree, trim, sudo)
+    merge_fragments(srctree, fragments, sudo)
+    if keyrings:
+        disable_keyrings(srctree, sudo)
+    # Resolve every symbol the base config does not mention without prompting
+    run_make(srctree, "olddefconfig", sudo)
+    return base_modules, count_modules(config_path)
@@ -0,0 +1,77 @@
+import os
+
+import inventory
+
+def list_installed_kernels(as_json=False):
+    kernels = inventory.installed_kernels()
+    inventory.print_kernels(kernels, as_json)
+    return kernels
+
+def choose_kernel(kernels, action):
+    try:
+        idx = int(input(f"Enter the number of the kernel to {action}: ")) - 1
+    except ValueError:
+        idx = -1
+    if idx < 0 or idx >= len(kernels):
+        print("Invalid selection.")
+        return None
+    return kernels[idx]
+
+def rename_kernel(kernels):
+    kernel = choose_kernel(kernels, "rename")
+    if not kernel:
+        return
+    old_name = kernel["release"]
+    if not kernel["image"]:
+        print(f"{old_name} has no kernel image in /boot.")
+        return
+    new_name = input(f"Enter the new name for {old_name}: ")
+    new_vmlinuz = os.path.join(os.path.dirname(kernel["image"]), f"vmlinuz-{new_name}")
+    try:
+        os.rename(kernel["image"], new_vmlinuz)
+        print(f"Renamed {old_name} to {new_name}.")
+    except OSError as e:
+        print(f"Error renaming {kernel['image']}: {e}")
+
+def delete_kernel(kernels):
+    kernel = choose_kernel(kernels, "delete")
+    if not kernel:
+        return
+    kernel_name = kernel["release"]
+    if kernel.get("running"):
+        print(f"{kernel_name} is the running kernel.")
+        return
+    confirm = input(f"Are you sure you want to delete {kernel_name}? (y/N): ")
+    if confirm.lower() != 'y':
+        print("Deletion cancelled.")
+        return
+    for file in [kernel["image"], *kernel["initramfs"]]:
+        if not file:
+            continue
+        try:
+            os.remove(file)
+            print(f"Deleted {file}.")
+        except FileNotFoundError:
+            print(f"File not found: {file}")
+        except OSError as e:
+            print(f"Error deleting file: {e}")
+
+def manage_kernels():
+    kernels = list_installed_kernels()
+    if not kernels:
+        return
+
+    print("\nManage kernels:")
+    print("1. Rename a kernel")
+    print("2. Delete a kernel")
+    choice = input("Enter your choice: ")
+
+    if choice == '1':
+        rename_kernel(kernels)
+    elif choice == '2':
+        delete_kernel(kernels)
+    else:
+        print("Invalid choice.")
+
+if __name__ == "__main__":
+    manage_kernels()
@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
 import argparse
-import arch
-import ubuntu
-import arch_man
-import ubuntu_man
+import os
+import sys
 import time
-import distro
+
+import backends
+
+# Copies of downloader, extractor, builder, kconfig, compress, profiler, retention and runner
+# defaults so that parsing the command line imports none of them
+DEFAULT_WORKERS = 8
+DEFAULT_COMPILER_CACHE_SIZE = '20G'
+DEFAULT_PROFILE_TOP = 20
+DEFAULT_KEEP = 2
+DECOMPRESSORS = ('auto', 'python', 'pixz', 'xz')
+COMPILER_CACHES = ('auto', 'none', 'ccache', 'sccache')
+CONFIG_SOURCES = ('running', 'localmodconfig', 'defconfig')
+COMPRESSION = ('auto', 'zstd', 'xz', 'none')
+BUILD_OUTPUT = ('full', 'errors', 'quiet')
 
 def display_author_info():
     author_name = "Someshwar S, Harshavardhan S"
@@ -13,54 +24,159 @@ def display_author_info():
     time.sleep(3)  # Display for 3 seconds
     print("\033[H\033[J")  # Clear the screen (works on Unix-like systems)
 
-def install_kernel(distro_module, debug):
-    available_versions = distro_module.get_available_versions(debug)
-    if not available_versions:
+def load_backend(verbose=False, manage=False):
+    # Backends are imported on demand so that quick commands like "list" do
+    # not pay for the build and networking modules
+    try:
+        name = backends.detect()
+    except backends.BackendError as e:
+        print(e)
+        sys.exit(1)
+    if verbose:
+        print(name)
+    return backends.load_manager(name) if manage else backends.load(name)
+
+def install_kernel(distro_module, debug, options):
+    import pipeline
+    import telemetry
+
+    state = pipeline.load_state() if options.resume else {}
+    selected_version = state.get("version")
+    patch_files = state.get("patches")
+    if selected_version:
+        print(f"Resuming the build of linux-{selected_version}")
+    else:
+        available_versions = distro_module.get_available_versions(debug, options.offline)
+        if not available_versions:
+            return
+
+        selected_version = distro_module.choose_kernel_version(available_versions, debug)
+
+    if not distro_module.install_packages(debug):
         return
+    if patch_files is None and options.series:
+        import series
 
-    selected_version = distro_module.choose_kernel_version(available_versions, debug)
+        try:
+            patch_files = series.load_series(options.series)
+        except series.SeriesError as e:
+            print(e)
+            return
+    if patch_files is None:
+        patch_files = distro_module.choose_patch_files(debug)
+        if patch_files is None:
+            return
+    patch_files = [os.path.abspath(patch_file) for patch_file in patch_files]
 
-    distro_module.install_packages(debug)
-    distro_module.download_kernel(selected_version, debug)
-    distro_module.extract_kernel(selected_version, debug)
-    distro_module.apply_patch(selected_version, debug)
-    distro_module.configure_kernel(selected_version, debug)
-    distro_module.compile_kernel(selected_version, debug)
-    distro_module.install_kernel(selected_version, debug)
-    distro_module.create_initramfs(selected_version, debug)
-    distro_module.update_bootloader(selected_version, debug)
+    # Interactive configuration has no inputs to compare, a resumed build
+    # keeps its .config as long as the file itself is unchanged
+    configure = lambda: distro_module.configure_kernel(selected_version, debug, trim=options.trim_modules)
+    configure_inputs = lambda: ["interactive", options.trim_modules, pipeline.file_digest(options.trim_modules)]
+    stages = pipeline.kernel_stages(distro_module, selected_version, options, patch_files, configure, configure_inputs)
+    recorder = telemetry.Recorder(selected_version, options.telemetry, options.prometheus)
+    recorder.finish(pipeline.run_stages(stages, selected_version, options.resume, extra={"patches": patch_files}, recorder=recorder, log_dir=options.log_dir, console=options.build_output))
 
 def main():
-    display_author_info()  # Display author info for 3 seconds
-
     parser = argparse.ArgumentParser(description="Linux Kernel Builder")
     parser.add_argument('-d', '--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Skip the author banner')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS, help='Number of parallel download connections')
+    parser.add_argument('--decompressor', choices=DECOMPRESSORS, default='auto', help='Decompressor used to extract the kernel tarball')
+    parser.add_argument('--spec', metavar='FILE', help='Run an unattended build described by a TOML build spec')
+    parser.add_argument('--pipeline', action='store_true', help='Extract the kernel while it is still downloading')
+    parser.add_argument('--offline', action='store_true', help='Use the cached kernel.org release list instead of the network')
+    parser.add_argument('--resume', action='store_true', help='Continue the last build, skipping stages whose inputs are unchanged')
+    parser.add_argument('--telemetry', metavar='FILE', help='Append per-stage timing and resource events to this JSON lines file (default: events.jsonl in the cache directory)')
+    parser.add_argument('--prometheus', metavar='FILE', help='Write stage metrics to FILE for the node_exporter textfile collector')
+    parser.add_argument('--log-dir', metavar='DIR', help='Write the compressed output of every stage to DIR (default: logs/linux-<version> in the cache directory)')
+    parser.add_argument('--build-output', choices=BUILD_OUTPUT, default='full', help='Console output of build commands: everything, only errors and warnings, or nothing (the logs always get everything)')
+    parser.add_argument('--series', metavar='PATH', help='Apply the patches of this quilt series file, or of this directory in name order, without asking')
+    parser.add_argument('--trim-modules', nargs='?', const='loaded', metavar='LSMOD_FILE', help='Drop every module that is not loaded now, or not listed in a saved lsmod output (localmodconfig)')
+    parser.add_argument('--incremental', action='store_true', help='Build in a persistent out-of-tree directory per version and config')
+    parser.add_argument('--compiler-cache', choices=COMPILER_CACHES, help='Wrap the compiler with ccache or sccache (default: auto with --incremental)')
+    parser.add_argument('--compiler-cache-size', default=DEFAULT_COMPILER_CACHE_SIZE, help='Maximum size of the compiler cache')
+    parser.add_argument('--package-dir', metavar='DIR', help='Also build installable kernel packages (.deb, .pkg.tar.zst, .rpm) into DIR')
+    parser.add_argument('--compress', choices=COMPRESSION, default='auto', help='Compress modules and initramfs in parallel with this format (default: auto, as the kernel config asks)')
+    parser.add_argument('--profile', metavar='DIR', help='Time every compile and link, write a report of the slowest files and directories and a Chrome/Perfetto trace to DIR')
+    parser.add_argument('--profile-top', type=int, default=DEFAULT_PROFILE_TOP, help='Number of entries in each profile ranking')
+    parser.add_argument('-j', '--jobs', type=int, help='Parallel make jobs (default: from CPU affinity, cgroup quota and free memory)')
+    parser.add_argument('-l', '--load-average', type=float, help='Do not start new make jobs above this load (default: number of CPUs)')
     #parser.add_argument('--distro', choices=['arch', 'ubuntu'])
+    subparsers = parser.add_subparsers(dest='command')
+    list_parser = subparsers.add_parser('list', help='List installed kernels')
+    list_parser.add_argument('--json', action='store_true', help='Print the kernel inventory as JSON')
+    cache_parser = subparsers.add_parser('cache', help='Inspect or prune the kernel source cache')
+    cache_parser.add_argument('action', choices=['ls', 'prune'])
+    cache_parser.add_argument('--max-size', help='Prune down to this size (e.g. 2G, 0 to empty the cache)')
+    prune_parser = subparsers.add_parser('prune', help='Remove old kernels, their modules and build directories, then update the bootloader once')
+    prune_parser.add_argument('--keep', type=int, default=DEFAULT_KEEP, help='Number of newest kernels to keep (the running kernel is always kept)')
+    prune_parser.add_argument('--pin', action='append', default=[], metavar='RELEASE', help='Never remove this release, shell patterns allowed (repeatable)')
+    prune_parser.add_argument('--dry-run', action='store_true', help='Only show what would be removed')
+    prune_parser.add_argument('-y', '--yes', action='store_true', help='Do not ask for confirmation')
+    deploy_parser = subparsers.add_parser('deploy', help='Install prebuilt kernel packages, then update initramfs and bootloader')
+    deploy_parser.add_argument('packages', nargs='+', help='Package files made with --package-dir')
+    deploy_parser.add_argument('--no-initramfs', action='store_true', help='Do not create an initramfs')
+    deploy_parser.add_argument('--no-bootloader', action='store_true', help='Do not update the bootloader')
+    matrix_parser = subparsers.add_parser('build-matrix', help='Build several kernel versions and configs side by side')
+    matrix_parser.add_argument('--versions', nargs='+', required=True, help='Kernel versions or mainline/stable/longterm')
+    matrix_parser.add_argument('--configs', nargs='+', default=['running'], help=f"Config sources ({', '.join(CONFIG_SOURCES)}) or .config files")
+    matrix_parser.add_argument('--patch', action='append', default=[], help='Patch applied to every build, in order (repeatable)')
+    matrix_parser.add_argument('--fragment', action='append', default=[], help='Config fragment merged into every build (repeatable)')
+    matrix_parser.add_argument('--disable-keyrings', action='store_true', help='Disable the Secure Boot trusted keyrings')
+    matrix_parser.add_argument('--output', default='kernel-matrix', help='Directory for source trees, logs and artifacts')
+    matrix_parser.add_argument('--parallel', type=int, default=2, help='Number of kernels compiled at the same time')
+    matrix_parser.add_argument('--cpu-budget', type=int, help='CPUs shared by all compiles (default: all available)')
     args = parser.parse_args()
     debug = args.debug
+    if args.log_dir:
+        args.log_dir = os.path.abspath(args.log_dir)
+    if args.trim_modules and args.trim_modules != 'loaded':
+        args.trim_modules = os.path.abspath(args.trim_modules)
+    if args.compiler_cache is None:
+        args.compiler_cache = 'auto' if args.incremental else 'none'
+
+    if args.command == 'cache':
+        import cache
+        sys.exit(0 if cache.run_command(args.action, args.max_size) else 1)
+    if args.command == 'list':
+        load_backend(manage=True).list_installed_kernels(args.json)
+        return
+    if args.command == 'prune':
+        import retention
+        update_bootloader = lambda: load_backend().update_bootloader(None, debug)
+        sys.exit(0 if retention.prune(args.keep, args.pin, args.dry_run, args.yes, update_bootloader, debug=debug) else 1)
+    if args.command == 'deploy':
+        sys.exit(0 if load_backend().deploy(args.packages, debug, not args.no_initramfs, not args.no_bootloader) else 1)
+
+    build_spec = None
+    if args.spec:
+        import spec
+        try:
+            build_spec = spec.load_spec(args.spec)
+        except spec.SpecError as e:
+            print(f"Build spec error: {e}")
+            sys.exit(spec.EXIT_BAD_SPEC)
+    elif args.command != 'build-matrix' and not args.quiet:
+        display_author_info()  # Display author info for 3 seconds
     #distroc = args.distro
 
-    print(distro.id())
+    distro_module = load_backend(verbose=True)
 
-    if distro.id() == 'arch':
-        distro_module = arch
-        manage_module = arch_man
-    elif distro.id() == 'ubuntu':
-        distro_module = ubuntu
-        manage_module = ubuntu_man
-    else:
-        print("Unsupported distribution.")
-        return
+    if build_spec:
+        sys.exit(spec.run_spec(build_spec, distro_module, args))
+    if args.command == 'build-matrix':
+        import matrix
+        sys.exit(matrix.run_matrix(distro_module, args, args.versions, args.configs, args.output, args.parallel, args.cpu_budget, args.patch, args.fragment, args.disable_keyrings))
 
     print("1. Install a new kernel")
     print("2. Manage existing kernels")
     choice = input("Enter your choice: ")
 
     if choice == '1':
-        install_kernel(distro_module, debug)
+        install_kernel(distro_module, debug, args)
     elif choice == '2':
         print()
-        manage_module.manage_kernels()
+        load_backend(manage=True).manage_kernels()
     else:
         print("Invalid choice.")
 
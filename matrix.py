@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+import contextlib
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import backends
+import builder
+import jobs
+import kconfig
+import runner
+import series
+import spec
+
+PREPARE_STAGES = ("fetch", "extract", "patch", "configure")
+ARTIFACTS = ("arch/x86/boot/bzImage", "System.map", ".config")
+
+
+def config_label(config):
+    if config in kconfig.CONFIG_SOURCES:
+        return config
+    return os.path.splitext(os.path.basename(config))[0]
+
+
+def make_entries(versions, configs, output_dir):
+    entries = []
+    for version in versions:
+        for config in configs:
+            name = f"{version}-{config_label(config)}"
+            workdir = os.path.abspath(os.path.join(output_dir, name))
+            if config in kconfig.CONFIG_SOURCES:
+                base, config_file = config, None
+            else:
+                base, config_file = "file", os.path.abspath(config)
+            entries.append({"name": name, "version": version, "base": base, "config_file": config_file, "workdir": workdir})
+    return entries
+
+
+@contextlib.contextmanager
+def redirect_output(log_path):
+    # dup2 so make and compiler output of child processes lands in the log too
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    with open(log_path, "a") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+
+
+def run_stages(entry, stages):
+    # Runs in a worker process, so changing directory does not affect other builds.
+    # build.log gets errors and warnings, logs/<stage>.log.zst everything.
+    os.makedirs(entry["workdir"], exist_ok=True)
+    os.chdir(entry["workdir"])
+    timings = {}
+    with redirect_output(os.path.join(entry["workdir"], "build.log")):
+        for name, stage in stages:
+            start = time.monotonic()
+            with runner.stage(name, os.path.join(entry["workdir"], "logs"), "errors") as capture:
+                ok = stage()
+            timings[name] = time.monotonic() - start
+            if not ok:
+                capture.report()
+                return {"name": entry["name"], "ok": False, "failed": name, "error": capture.first_error(), "timings": timings}
+    return {"name": entry["name"], "ok": True, "failed": None, "timings": timings}
+
+
+def prepare_entry(entry, distro_name, options, patches, fragments, keyrings):
+    distro_module = backends.load(distro_name)
+    version, debug = entry["version"], options.debug
+    stages = [
+        ("fetch", lambda: distro_module.download_kernel(version, debug, options.workers)),
+        ("extract", lambda: distro_module.extract_kernel(version, debug, options.decompressor, patches)),
+        ("patch", lambda: distro_module.apply_patch(version, debug, patch_files=patches)),
+        ("configure", lambda: distro_module.configure_kernel(version, debug, entry["base"], entry["config_file"], fragments, keyrings, options.trim_modules)),
+    ]
+    return run_stages(entry, stages)
+
+
+def compile_entry(entry, distro_name, options, job_count, load):
+    distro_module = backends.load(distro_name)
+    version, debug = entry["version"], options.debug
+
+    def collect():
+        srctree = f"linux-{version}"
+        objdir = builder.object_dir(srctree) or srctree
+        artifacts_dir = os.path.join(entry["workdir"], "artifacts")
+        os.makedirs(artifacts_dir, exist_ok=True)
+        for artifact in ARTIFACTS:
+            path = os.path.join(objdir, artifact)
+            if os.path.exists(path):
+                shutil.copy2(path, os.path.join(artifacts_dir, os.path.basename(artifact)))
+        return True
+
+    profile_dir = os.path.join(options.profile, entry["name"]) if options.profile else None
+    stages = [
+        ("compile", lambda: distro_module.compile_kernel(version, debug, options.incremental, options.compiler_cache, options.compiler_cache_size, job_count, load, profile_dir, options.profile_top)),
+        ("artifacts", collect),
+    ]
+    return run_stages(entry, stages)
+
+
+def outcome(future, entry):
+    # A worker that raised or died fails its own build, not the whole batch
+    try:
+        return future.result()
+    except Exception as e:
+        return {"name": entry["name"], "ok": False, "failed": "crashed", "error": f"{type(e).__name__}: {e}", "timings": {}}
+
+
+def print_summary(entries, results):
+    stages = (*PREPARE_STAGES, "compile")
+    print(f"{'build':<28} {'status':<18}" + "".join(f"{stage:>11}" for stage in stages) + f"{'total':>11}")
+    for entry in entries:
+        result = results.get(entry["name"], {"ok": False, "failed": "not run", "timings": {}})
+        timings = result["timings"]
+        status = "ok" if result["ok"] else f"failed: {result['failed']}"
+        cells = "".join(f"{timings[stage]:>10.1f}s" if stage in timings else f"{'-':>11}" for stage in stages)
+        print(f"{entry['name']:<28} {status:<18}{cells}{sum(timings.values()):>10.1f}s")
+
+
+def run_matrix(distro_module, options, versions, configs, output_dir, parallel=2, cpu_budget=None, patches=(), fragments=(), keyrings=False):
+    try:
+        versions = [spec.resolve_version(version, distro_module, options.debug, options.offline) for version in versions]
+        if options.series:
+            patches = [*patches, *series.load_series(options.series)]
+    except (spec.SpecError, series.SeriesError) as e:
+        print(f"Build matrix error: {e}")
+        return spec.EXIT_BAD_SPEC
+    patches = [os.path.abspath(patch) for patch in patches]
+    fragments = [os.path.abspath(fragment) for fragment in fragments]
+    if options.profile:
+        options.profile = os.path.abspath(options.profile)
+    config_files = [config for config in configs if config not in kconfig.CONFIG_SOURCES]
+    missing = [path for path in (*patches, *fragments, *config_files) if not os.path.exists(path)]
+    if missing:
+        print(f"Build matrix error: not found: {', '.join(missing)}")
+        return spec.EXIT_BAD_SPEC
+    entries = make_entries(versions, configs, output_dir)
+    names = [entry["name"] for entry in entries]
+    if len(set(names)) != len(names):
+        print("Build matrix error: every version and config pair must be unique")
+        return spec.EXIT_BAD_SPEC
+
+    # Compiles share one CPU budget: each gets an equal slice of -j, and all
+    # of them back off once the machine load reaches the whole budget
+    cpu_budget = cpu_budget or jobs.available_cpus()
+    parallel = max(1, min(parallel, len(entries)))
+    job_count = max(1, cpu_budget // parallel)
+    # Prepares download, extract and configure; builds of one version wait
+    # on each other's download through the source cache lock
+    prepare_workers = max(1, min(len(entries), cpu_budget))
+    print(f"Building {len(entries)} kernels, {parallel} at a time with -j{job_count} each (CPU budget {cpu_budget})")
+
+    results = {}
+    distro_name = distro_module.name
+    with ProcessPoolExecutor(max_workers=prepare_workers) as prepare_pool, ProcessPoolExecutor(max_workers=parallel) as compile_pool:
+        prepared = {prepare_pool.submit(prepare_entry, entry, distro_name, options, patches, fragments, keyrings): entry for entry in entries}
+        compiles = {}
+        for future in as_completed(prepared):
+            entry = prepared[future]
+            result = outcome(future, entry)
+            results[entry["name"]] = result
+            print(f"{entry['name']}: {'prepared' if result['ok'] else 'failed in ' + result['failed']}")
+            if result.get("error"):
+                print(f"    {result['error']}")
+            if result["ok"]:
+                compiles[compile_pool.submit(compile_entry, entry, distro_name, options, job_count, float(cpu_budget))] = entry
+        for future in as_completed(compiles):
+            entry = compiles[future]
+            result = outcome(future, entry)
+            prepared_timings = results[entry["name"]]["timings"]
+            results[entry["name"]] = {**result, "timings": {**prepared_timings, **result["timings"]}}
+            print(f"{entry['name']}: {'built' if result['ok'] else 'failed in ' + result['failed']}")
+            if result.get("error"):
+                print(f"    {result['error']}")
+
+    print()
+    print_summary(entries, results)
+    print(f"\nLogs and artifacts are in {os.path.abspath(output_dir)}")
+    return spec.EXIT_OK if all(result["ok"] for result in results.values()) else spec.EXIT_STAGE_FAILED
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import subprocess
+
+import cache
+import runner
+from engine import colors
+
+# Where each package manager keeps its database; the modification time
+# changes whenever a package is installed or removed
+PACKAGE_DBS = {
+    "pacman": ("/var/lib/pacman/local",),
+    "apt": ("/var/lib/dpkg/status",),
+    "dnf": ("/usr/lib/sysimage/rpm", "/var/lib/rpm"),
+}
+
+
+def state_path():
+    return os.path.join(cache.cache_dir(), "packages.json")
+
+
+def fingerprint(manager, packages):
+    stamps = []
+    for path in PACKAGE_DBS[manager]:
+        try:
+            stamps.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            stamps.append(None)
+    return hashlib.sha256(json.dumps([manager, sorted(packages), stamps]).encode()).hexdigest()
+
+
+def load_fingerprints():
+    try:
+        with open(state_path()) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_fingerprint(manager, value):
+    fingerprints = load_fingerprints()
+    fingerprints[manager] = value
+    os.makedirs(os.path.dirname(state_path()), exist_ok=True)
+    tmp = f"{state_path()}.{os.getpid()}.tmp"
+    with open(tmp, "w") as state_file:
+        json.dump(fingerprints, state_file)
+    os.replace(tmp, state_path())
+
+
+def missing_packages(manager, packages):
+    # One query for the whole list instead of one process per package
+    if manager == "pacman":
+        # pacman -T prints every dependency that is not satisfied
+        result = subprocess.run(["pacman", "-T", *packages], capture_output=True, text=True)
+        return result.stdout.split()
+    if manager == "apt":
+        result = subprocess.run(["dpkg-query", "-W", "-f", "${Package} ${db:Status-Abbrev}\n", *packages], capture_output=True, text=True)
+        installed = {line.split()[0] for line in result.stdout.splitlines() if line.split()[1:2] == ["ii"]}
+        return [package for package in packages if package not in installed]
+    if manager == "dnf":
+        result = subprocess.run(["rpm", "-q", "--whatprovides", *packages], capture_output=True, text=True)
+        # rpm prints "no package provides <name>" for every name it cannot resolve
+        unresolved = {line.removeprefix("no package provides").strip() for line in result.stdout.splitlines() if line.startswith("no package provides")}
+        return [package for package in packages if package in unresolved]
+    raise ValueError(f"Unknown package manager {manager}")
+
+
+def install_commands(manager, missing, assume_yes=False):
+    if manager == "pacman":
+        # -S without -y: installing build tools must not turn into a system upgrade
+        return [["sudo", "pacman", "-S", "--needed", *(["--noconfirm"] if assume_yes else []), *missing]]
+    if manager == "apt":
+        return [["sudo", "apt-get", "update"], ["sudo", "apt-get", "install", "-y", *missing]]
+    if manager == "dnf":
+        return [["sudo", "dnf", "install", *(["-y"] if assume_yes else []), *missing]]
+    raise ValueError(f"Unknown package manager {manager}")
+
+
+def ensure_packages(manager, packages, debug=False, assume_yes=False):
+    if load_fingerprints().get(manager) == fingerprint(manager, packages):
+        if debug:
+            print(f"{colors.GREEN}Package database unchanged since the last check, skipping{colors.END}")
+        return True
+    try:
+        missing = missing_packages(manager, packages)
+    except OSError as e:
+        print(f"{colors.RED}Cannot query installed packages: {e}{colors.END}")
+        return False
+
+    if missing:
+        print(f"{colors.CYAN}Installing missing packages: {' '.join(missing)}{colors.END}")
+        for command in install_commands(manager, missing, assume_yes):
+            if debug:
+                print(f"{colors.CYAN}Running '{' '.join(command)}'{colors.END}")
+            if runner.run(command) != 0:
+                print(f"{colors.RED}Package installation failed{colors.END}")
+                return False
+        print(f"{colors.GREEN}Package installation completed{colors.END}")
+    elif debug:
+        print(f"{colors.GREEN}All {len(packages)} prerequisite packages are installed{colors.END}")
+    # Taken after installing, so the next run matches as long as nothing changes
+    try:
+        save_fingerprint(manager, fingerprint(manager, packages))
+    except OSError:
+        pass
+    return True
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+
+import builder
+import cache
+import runner
+
+STATE_FILE = ".kernel-builder-state.json"
+
+
+class Stage:
+    def __init__(self, name, run, inputs=None, outputs=None, reset=None, rewind=None):
+        self.name = name
+        self.run = run
+        # Inputs of the stage itself; the outputs of the stage before it are
+        # always part of its key, so a change invalidates everything after it
+        self.inputs = inputs or (lambda: None)
+        # Fingerprint of what the stage left behind, None once it is gone
+        self.outputs = outputs or (lambda key: key)
+        self.reset = reset
+        # Stage to restart from when this one has to rerun on a tree it already changed
+        self.rewind = rewind
+
+
+def digest(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def file_digest(path):
+    return cache.sha256_file(path) if path and os.path.isfile(path) else None
+
+
+def config_path(srctree):
+    # Incremental builds move .config into the object directory
+    objdir = builder.object_dir(srctree)
+    if not os.path.exists(os.path.join(srctree, ".config")) and objdir:
+        return os.path.join(objdir, ".config")
+    return os.path.join(srctree, ".config")
+
+
+def remove_path(path):
+    if os.path.isdir(path):
+        try:
+            shutil.rmtree(path)
+        except PermissionError:
+            # Trees built with sudo are partly owned by root
+            subprocess.run(["sudo", "rm", "-rf", path], check=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_FILE):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as state_file:
+        json.dump(state, state_file, indent=2)
+    os.replace(tmp, path)
+
+
+def kernel_stages(distro_module, version, options, patches, configure, configure_inputs, skip=()):
+    debug = options.debug
+    if not options.package_dir:
+        skip = (*skip, "package")
+    srctree = f"linux-{version}"
+    tarball = f"{srctree}.tar.xz"
+    tree_exists = lambda key: key if os.path.isdir(srctree) else None
+
+    if options.pipeline:
+        fetch = lambda: distro_module.fetch_and_extract_kernel(version, debug, options.decompressor, patches)
+    else:
+        fetch = lambda: distro_module.download_kernel(version, debug, options.workers)
+
+    def compiled(key):
+        objdir = builder.object_dir(srctree) or srctree
+        return key if os.path.exists(os.path.join(objdir, "vmlinux")) else None
+
+    stages = [
+        Stage("fetch", fetch, outputs=lambda key: file_digest(tarball), reset=lambda: remove_path(tarball)),
+        Stage("extract", lambda: distro_module.extract_kernel(version, debug, options.decompressor, patches), outputs=tree_exists, reset=lambda: remove_path(srctree)),
+        Stage("patch", lambda: distro_module.apply_patch(version, debug, patch_files=patches), inputs=lambda: [file_digest(patch) for patch in patches], outputs=tree_exists, rewind="extract"),
+        Stage("configure", configure, inputs=configure_inputs, outputs=lambda key: file_digest(config_path(srctree))),
+        Stage("compile", lambda: distro_module.compile_kernel(version, debug, options.incremental, options.compiler_cache, options.compiler_cache_size, options.jobs, options.load_average, options.profile, options.profile_top), outputs=compiled),
+        Stage("package", lambda: bool(distro_module.package_kernel(version, debug, options.package_dir, options.jobs, options.load_average))),
+        Stage("install", lambda: distro_module.install_kernel(version, debug, options.compress), inputs=lambda: [options.compress]),
+        Stage("initramfs", lambda: distro_module.create_initramfs(version, debug, options.compress), inputs=lambda: [options.compress]),
+        Stage("bootloader", lambda: distro_module.update_bootloader(version, debug)),
+    ]
+    return [stage for stage in stages if stage.name not in skip]
+
+
+def run_stages(stages, version, resume=False, state_path=STATE_FILE, extra=None, recorder=None, log_dir=None, console="full"):
+    log_dir = log_dir or runner.default_log_dir(version)
+    state = load_state(state_path) if resume else {}
+    if state.get("version") != version:
+        state = {"version": version, "stages": {}}
+    state.update(extra or {})
+    records = state["stages"]
+    names = [stage.name for stage in stages]
+
+    previous = digest(version)
+    keys = {}
+    invalidated = not resume
+    index = 0
+    while index < len(stages):
+        stage = stages[index]
+        key = digest(previous, stage.inputs())
+        record = records.get(stage.name)
+        if not invalidated and record and record.get("key") == key and record.get("outputs") == stage.outputs(key):
+            print(f"Skipping {stage.name}, its inputs are unchanged")
+            if recorder:
+                recorder.skip(stage.name)
+            keys[stage.name] = previous
+            previous = record["outputs"]
+            index += 1
+            continue
+
+        if resume and record and stage.rewind and not invalidated:
+            # The tree already carries this stage's old changes, start over from a clean one
+            print(f"{stage.name} inputs changed, restarting from {stage.rewind}")
+            index = names.index(stage.rewind)
+            invalidated = True
+            previous = keys[stage.rewind]
+            continue
+        # Records of invalidated stages are kept until they rerun, they tell
+        # which leftovers of an earlier run have to be cleaned up first
+        if resume and record and stage.reset:
+            stage.reset()
+        invalidated = True
+        records[stage.name] = {"key": None, "started": time.time()}
+        save_state(state, state_path)
+        # Every command of the stage is logged to <log_dir>/<stage>.log.zst
+        with runner.stage(stage.name, log_dir, console) as capture:
+            ok = recorder.stage(stage.name, stage.run) if recorder else stage.run()
+        if not ok:
+            print(f"Stage {stage.name} failed, rerun with --resume to continue from here")
+            capture.report()
+            return False
+        outputs = stage.outputs(key)
+        records[stage.name] = {"key": key, "outputs": outputs, "completed": time.time()}
+        save_state(state, state_path)
+        keys[stage.name] = previous
+        previous = outputs
+        index += 1
+    return True
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import json
+import os
+import shutil
+import tempfile
+
+DEFAULT_TOP = 20
+REPORT_FILE = "compile-profile.txt"
+TRACE_FILE = "compile-trace.json"
+# Top-level directories that hold many unrelated subsystems, grouped one level deeper
+SUBSYSTEM_ROOTS = ("arch", "drivers", "fs", "net", "sound")
+
+# Runs the compiler or linker and appends "start end status output" in
+# microseconds to the log. bash's EPOCHREALTIME avoids forking date(1)
+# twice for every object file.
+WRAPPER = r'''#!/bin/bash
+log=$1
+kind=$2
+shift 2
+start=${EPOCHREALTIME/[.,]/}
+[ -n "$start" ] || start=$(date +%s%6N)
+"$@"
+status=$?
+end=${EPOCHREALTIME/[.,]/}
+[ -n "$end" ] || end=$(date +%s%6N)
+out=
+prev=
+for arg in "$@"; do
+    [ "$prev" = "-o" ] && out=$arg
+    prev=$arg
+done
+[ -n "$out" ] && echo "$start $end $status $kind $out" >> "$log"
+exit $status
+'''
+
+
+def prepare():
+    directory = tempfile.mkdtemp(prefix="kernel-builder-profile-")
+    wrapper = os.path.join(directory, "wrap.sh")
+    with open(wrapper, "w") as wrapper_file:
+        wrapper_file.write(WRAPPER)
+    log = os.path.join(directory, "compile.log")
+    open(log, "w").close()
+    # Builds run with sudo write to the log as root
+    os.chmod(directory, 0o755)
+    os.chmod(log, 0o666)
+    return directory, wrapper, log
+
+
+def cleanup(directory):
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def wrapper_command(wrapper, log, kind):
+    return ["bash", wrapper, log, kind]
+
+
+def linker_args(wrapper, log):
+    linker = os.environ.get("LD", "ld")
+    return [f"LD={' '.join([*wrapper_command(wrapper, log, 'ld'), linker])}"]
+
+
+def load_records(log):
+    # Only objects of the kernel itself: kbuild passes relative output paths,
+    # compiler feature probes write to /dev/null or temporary files
+    records = []
+    with open(log) as log_file:
+        for line in log_file:
+            fields = line.split(maxsplit=4)
+            if len(fields) != 5 or not fields[0].isdigit() or not fields[1].isdigit():
+                continue
+            start, end, status, kind, output = fields
+            output = output.strip()
+            if os.path.isabs(output):
+                continue
+            records.append({"start": int(start), "end": int(end), "ok": status == "0", "kind": kind, "output": os.path.normpath(output)})
+    records.sort(key=lambda record: record["start"])
+    return records
+
+
+def duration(record):
+    return (record["end"] - record["start"]) / 1e6
+
+
+def subsystem(path):
+    parts = os.path.dirname(path).split(os.sep)
+    if len(parts) > 1 and parts[0] in SUBSYSTEM_ROOTS:
+        return os.path.join(parts[0], parts[1])
+    return parts[0] or "."
+
+
+def group(records, key):
+    totals = {}
+    for record in records:
+        name = key(record["output"])
+        seconds, count = totals.get(name, (0.0, 0))
+        totals[name] = (seconds + duration(record), count + 1)
+    return sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+
+
+def occupancy(records):
+    # Seconds spent with each number of jobs running, from the first start to the last end
+    changes = sorted([(record["start"], 1) for record in records] + [(record["end"], -1) for record in records])
+    spent = {}
+    running = 0
+    previous = changes[0][0] if changes else 0
+    for timestamp, change in changes:
+        spent[running] = spent.get(running, 0.0) + (timestamp - previous) / 1e6
+        running += change
+        previous = timestamp
+    return spent
+
+
+def report(records, top=DEFAULT_TOP):
+    if not records:
+        return "No compiler invocations were recorded"
+    compiles = [record for record in records if record["kind"] == "cc"]
+    links = [record for record in records if record["kind"] == "ld"]
+    wall = (max(record["end"] for record in records) - records[0]["start"]) / 1e6
+    busy = sum(duration(record) for record in records)
+    spent = occupancy(records)
+    idle = spent.get(0, 0.0)
+    serial = spent.get(1, 0.0)
+    lines = [
+        f"{len(compiles)} compiles and {len(links)} links in {wall:.1f}s wall, {busy:.1f} job-seconds, {busy / wall if wall else 0:.1f} jobs running on average",
+        f"Single job running for {serial:.1f}s ({100 * serial / wall if wall else 0:.0f}%), none for {idle:.1f}s ({100 * idle / wall if wall else 0:.0f}%)",
+        "",
+        f"Slowest {top} files:",
+    ]
+    lines += [f"{duration(record):>9.2f}s  {record['output']}" for record in sorted(compiles, key=duration, reverse=True)[:top]]
+    lines += ["", f"Slowest {top} directories:"]
+    lines += [f"{seconds:>9.1f}s {count:>6} files  {name or '.'}" for name, (seconds, count) in group(compiles, os.path.dirname)[:top]]
+    lines += ["", "Subsystems:"]
+    lines += [f"{seconds:>9.1f}s {count:>6} files  {name}" for name, (seconds, count) in group(compiles, subsystem)[:top]]
+    if links:
+        lines += ["", f"Slowest {top} links:"]
+        lines += [f"{duration(record):>9.2f}s  {record['output']}" for record in sorted(links, key=duration, reverse=True)[:top]]
+    return "\n".join(lines)
+
+
+def trace(records):
+    # Chrome trace event format, opens in Perfetto and chrome://tracing. Jobs
+    # are packed into lanes so every lane is one make job slot.
+    if not records:
+        return {"traceEvents": []}
+    origin = records[0]["start"]
+    lanes = []
+    events = []
+    for record in records:
+        lane = next((index for index, end in enumerate(lanes) if end <= record["start"]), len(lanes))
+        if lane == len(lanes):
+            lanes.append(0)
+        lanes[lane] = record["end"]
+        events.append({"name": record["output"], "cat": record["kind"], "ph": "X", "ts": record["start"] - origin, "dur": record["end"] - record["start"], "pid": 1, "tid": lane, "args": {"ok": record["ok"]}})
+    running = 0
+    for timestamp, change in sorted([(record["start"], 1) for record in records] + [(record["end"], -1) for record in records]):
+        running += change
+        events.append({"name": "jobs", "ph": "C", "ts": timestamp - origin, "pid": 1, "args": {"running": running}})
+    events.append({"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "kernel build"}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_results(log, output_dir, top=DEFAULT_TOP):
+    records = load_records(log)
+    os.makedirs(output_dir, exist_ok=True)
+    text = report(records, top)
+    with open(os.path.join(output_dir, REPORT_FILE), "w") as report_file:
+        report_file.write(text + "\n")
+    with open(os.path.join(output_dir, TRACE_FILE), "w") as trace_file:
+        json.dump(trace(records), trace_file)
+    return text
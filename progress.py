@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+import collections
+import sys
+import threading
+import time
+
+import cache
+
+REFRESH_RATE = 10
+# Seconds between progress lines when the output is a log file, not a terminal
+LOG_INTERVAL = 10
+BAR_WIDTH = 30
+# Throughput is measured over the last few seconds so ETA follows the current speed
+RATE_WINDOW = 5.0
+
+
+def format_amount(amount, unit):
+    return cache.format_size(amount) if unit == "B" else f"{amount:.0f} {unit}"
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02}:{seconds % 60:02}"
+    return f"{seconds // 60}:{seconds % 60:02}"
+
+
+class Bar:
+    def __init__(self, display, label, total=None, unit="B"):
+        self.display = display
+        self.label = label
+        self.total = total or None
+        self.unit = unit
+        self.done = 0
+        self.started = time.monotonic()
+        self.samples = collections.deque([(self.started, 0)])
+        self.finished = None
+
+    def update(self, done, total=None):
+        # Called for every chunk; only the display decides whether to draw
+        self.done = done
+        if total:
+            self.total = total
+        self.display.tick()
+
+    def advance(self, amount):
+        self.update(self.done + amount)
+
+    def finish(self, ok=True):
+        self.finished = "done" if ok else "failed"
+        self.display.tick(force=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc_type is None)
+
+    def rate(self, now):
+        samples = self.samples
+        if now - samples[-1][0] >= 0.1:
+            samples.append((now, self.done))
+        while len(samples) > 2 and now - samples[1][0] > RATE_WINDOW:
+            samples.popleft()
+        seconds = now - samples[0][0]
+        return (self.done - samples[0][1]) / seconds if seconds > 0 else 0.0
+
+    def line(self, now, width=BAR_WIDTH):
+        rate = self.rate(now)
+        speed = f"{format_amount(rate, self.unit)}/s"
+        if self.finished:
+            elapsed = now - self.started
+            average = f"{format_amount(self.done / elapsed if elapsed > 0 else 0, self.unit)}/s"
+            return f"{self.label} {self.finished}: {format_amount(self.done, self.unit)} in {elapsed:.1f}s ({average})"
+        if not self.total:
+            # Size unknown, e.g. no content-length: amount and speed only
+            return f"{self.label} {format_amount(self.done, self.unit)} {speed}"
+        fraction = min(self.done / self.total, 1.0)
+        eta = format_duration((self.total - self.done) / rate) if rate > 0 else "?"
+        filled = int(width * fraction)
+        bar = f"|{'█' * filled}{'-' * (width - filled)}| " if width else ""
+        return f"{self.label} {bar}{100 * fraction:5.1f}% {format_amount(self.done, self.unit)} of {format_amount(self.total, self.unit)} {speed} ETA {eta}"
+
+
+class Display:
+    # Any number of bars, drawn together at most refresh_rate times a second.
+    # A terminal gets live bars redrawn in place; anything else gets one line
+    # per bar every log_interval seconds and a final line when a bar finishes.
+    def __init__(self, stream=None, refresh_rate=REFRESH_RATE, log_interval=LOG_INTERVAL, tty=None):
+        self.stream = stream or sys.stdout
+        self.tty = self.stream.isatty() if tty is None else tty
+        self.interval = 1.0 / refresh_rate if self.tty else log_interval
+        self.bars = []
+        self.lock = threading.Lock()
+        self.last = 0.0
+        self.drawn = 0
+        self.renders = 0
+
+    def bar(self, label, total=None, unit="B"):
+        bar = Bar(self, label, total, unit)
+        with self.lock:
+            self.bars.append(bar)
+        return bar
+
+    def tick(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last < self.interval:
+            return
+        with self.lock:
+            self.render(now, force)
+
+    def render(self, now, force=False):
+        self.last = now
+        self.renders += 1
+        done = [bar for bar in self.bars if bar.finished]
+        active = [bar for bar in self.bars if not bar.finished]
+        self.bars = active
+        if self.tty:
+            # Move back over the live bars, finished ones scroll up and stay
+            text = f"\033[{self.drawn}F" if self.drawn else ""
+            text += "".join(f"{bar.line(now)}\033[K\n" for bar in done + active)
+            self.drawn = len(active)
+        else:
+            shown = done if force and done else done + active
+            text = "".join(f"{bar.line(now, width=0)}\n" for bar in shown)
+        self.stream.write(text)
+        self.stream.flush()
+
+
+_display = None
+
+
+def display():
+    # One display per process so bars from several threads share the screen
+    global _display
+    if _display is None:
+        _display = Display()
+    return _display
+
+
+def bar(label, total=None, unit="B"):
+    return display().bar(label, total, unit)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import json
+import os
+import time
+
+import cache
+
+RELEASES_URL = "https://www.kernel.org/releases.json"
+DEFAULT_TTL = 3600
+TIMEOUT = (5, 15)
+
+
+class ReleasesError(Exception):
+    pass
+
+
+def releases_ttl():
+    value = os.environ.get("KERNEL_BUILDER_RELEASES_TTL")
+    return int(value) if value else DEFAULT_TTL
+
+
+def cache_paths():
+    root = cache.cache_dir()
+    return os.path.join(root, "releases.json"), os.path.join(root, "releases.meta.json")
+
+
+def load_cached():
+    data_path, meta_path = cache_paths()
+    try:
+        with open(data_path) as data_file:
+            data = json.load(data_file)
+    except (OSError, ValueError):
+        return None, {}
+    try:
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        meta = {}
+    return data, meta
+
+
+def write_atomic(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as target:
+        target.write(text)
+    os.replace(tmp, path)
+
+
+def store(body, meta):
+    data_path, meta_path = cache_paths()
+    if body is not None:
+        write_atomic(data_path, body)
+    write_atomic(meta_path, json.dumps(meta))
+
+
+def fetch_releases(url=RELEASES_URL, ttl=None, offline=False, session=None):
+    # Returns the release list and where it came from: "cache" (within the
+    # TTL or offline), "revalidated" (304), "network" or "stale" (network failed)
+    ttl = releases_ttl() if ttl is None else ttl
+    data, meta = load_cached()
+    if data is not None and (offline or time.time() - meta.get("fetched", 0) < ttl):
+        return data.get("releases", []), "cache"
+    if offline:
+        raise ReleasesError("No cached releases.json, run once without --offline")
+
+    # Only pay for importing requests when the network is actually used
+    import requests
+
+    headers = {}
+    if data is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    try:
+        response = (session or requests).get(url, headers=headers, timeout=TIMEOUT)
+        if response.status_code == 304 and data is not None:
+            store(None, {**meta, "fetched": time.time()})
+            return data.get("releases", []), "revalidated"
+        if response.status_code != 200:
+            raise ReleasesError(f"HTTP {response.status_code} for {url}")
+        fresh = response.json()
+    except (requests.RequestException, ValueError, ReleasesError) as e:
+        if data is not None:
+            return data.get("releases", []), "stale"
+        raise ReleasesError(f"Cannot fetch {url}: {e}")
+
+    store(response.text, {
+        "fetched": time.time(),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    })
+    return fresh.get("releases", []), "network"
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import fnmatch
+import os
+import shutil
+import subprocess
+
+import builder
+import cache
+import inventory
+
+DEFAULT_KEEP = 2
+# Commands that exit 0 when a file belongs to an installed package
+OWNER_QUERIES = (["pacman", "-Qqo"], ["dpkg", "-S"], ["rpm", "-qf"])
+
+
+def package_owner_query():
+    return next((query for query in OWNER_QUERIES if shutil.which(query[0])), None)
+
+
+def packaged(record, query):
+    # Distribution kernels are removed with the package manager, deleting
+    # their files would leave the package database out of sync. Any owned
+    # file counts, Arch's mkinitcpio copies the image to /boot unowned.
+    if not query:
+        return False
+    paths = [path for path in (record["image"], record["modules_dir"]) if path]
+    return any(subprocess.run([*query, path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0 for path in paths)
+
+
+def build_dirs(root="/"):
+    # Incremental build directories record the release they were built for
+    if root != "/":
+        return {}
+    dirs = {}
+    try:
+        names = sorted(os.listdir(builder.build_root()))
+    except OSError:
+        return dirs
+    for name in names:
+        path = os.path.join(builder.build_root(), name)
+        try:
+            with open(os.path.join(path, "include/config/kernel.release")) as release_file:
+                release = release_file.read().strip()
+        except OSError:
+            continue
+        dirs.setdefault(release, []).append(path)
+    return dirs
+
+
+def tree_size(path):
+    size = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            full = os.path.join(directory, name)
+            if not os.path.islink(full):
+                size += os.path.getsize(full)
+    return size
+
+
+def select(kernels, keep=DEFAULT_KEEP, pins=(), query=None):
+    # Returns (kernel, reason) for every kernel that stays and the list to remove
+    kept = []
+    removed = []
+    newest = [record["release"] for record in kernels if record["image"]][-keep:] if keep > 0 else []
+    for record in reversed(kernels):
+        if record.get("running"):
+            kept.append((record, "running"))
+        elif any(fnmatch.fnmatch(record["release"], pin) for pin in pins):
+            kept.append((record, "pinned"))
+        elif record["release"] in newest:
+            kept.append((record, "newest"))
+        elif packaged(record, query):
+            kept.append((record, "packaged"))
+        else:
+            removed.append(record)
+    return kept, removed
+
+
+def targets(record, builds):
+    paths = [record["image"], *record["initramfs"], *record["entries"], record["modules_dir"], *builds.get(record["release"], [])]
+    return [path for path in paths if path]
+
+
+def reclaimed(record, builds):
+    return record["image_size"] + record["initramfs_size"] + record["modules_size"] + sum(tree_size(path) for path in builds.get(record["release"], []))
+
+
+def remove(paths, debug=False):
+    # One rm for the whole batch; /boot and /lib/modules need root
+    prefix = ["sudo"] if os.geteuid() != 0 else []
+    if debug:
+        print(f"Running '{' '.join(prefix + ['rm', '-rf', '--'] + paths)}'")
+    return subprocess.run(prefix + ["rm", "-rf", "--", *paths]).returncode == 0
+
+
+def prune(keep=DEFAULT_KEEP, pins=(), dry_run=False, assume_yes=False, update_bootloader=None, root="/", debug=False):
+    kernels = inventory.installed_kernels(root, refresh=True)
+    kept, removed = select(kernels, keep, pins, package_owner_query() if root == "/" else None)
+    for record, reason in kept:
+        print(f"Keeping  {record['release']} ({reason})")
+    if not removed:
+        print("Nothing to prune.")
+        return True
+
+    builds = build_dirs(root)
+    total = 0
+    for record in removed:
+        size = reclaimed(record, builds)
+        total += size
+        print(f"Removing {record['release']:<32} {cache.format_size(size):>11}")
+        if debug:
+            for path in targets(record, builds):
+                print(f"    {path}")
+    print(f"Removing {len(removed)} of {len(kernels)} kernels frees {cache.format_size(total)}.")
+    if dry_run:
+        return True
+    if not assume_yes and input("Continue? (y/N): ").lower() != 'y':
+        print("Prune cancelled.")
+        return True
+
+    if not remove([path for record in removed for path in targets(record, builds)], debug):
+        print("Some files could not be removed.")
+        return False
+    print(f"Freed {cache.format_size(total)}.")
+    # The boot menu is regenerated once for the whole batch, the kept
+    # kernels already have their entries
+    return update_bootloader() if update_bootloader else True
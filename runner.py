@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import collections
+import contextlib
+import gzip
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import cache
+
+READ_SIZE = 64 * 1024
+# Lines of output kept in memory for the failure report
+RING_LINES = 200
+TAIL_LINES = 20
+CONSOLE_MODES = ("full", "errors", "quiet")
+# Most specific first: a compiler error names the file and line, make's
+# "***" line that follows it only names the target
+ERROR_PATTERNS = (
+    re.compile(r'^(?P<file>[^\s:][^:]*):(?P<line>\d+):(?:\d+:)?\s*(?:fatal )?error: (?P<message>.*)$'),
+    re.compile(r'^(?:(?P<file>[^\s:][^:]*):(?P<line>\d+): )?(?P<message>.*undefined reference to .*)$'),
+    re.compile(r'^(?P<message>(?:ERROR|FATAL): .*)$'),
+    re.compile(r'^make(?:\[\d+\])?: \*\*\* (?P<message>.*)$'),
+)
+# Cheap test before the regular expressions, most lines are "  CC foo.o"
+ERROR_MARKERS = (b"error", b"ERROR", b"FATAL", b"undefined reference", b"***")
+CONSOLE_MARKERS = (b"error", b"ERROR", b"FATAL", b"warning:", b"undefined reference", b"***")
+
+# The capture of the stage that is running, commands outside a stage are not logged
+current = None
+
+
+def default_log_dir(version):
+    return os.path.join(cache.cache_dir(), "logs", f"linux-{version}")
+
+
+class CompressedLog:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if shutil.which("zstd"):
+            self.path = f"{path}.zst"
+            self.process = subprocess.Popen(["zstd", "-q", "-f", "-T0", "-o", self.path], stdin=subprocess.PIPE)
+            self.file = self.process.stdin
+        else:
+            self.path = f"{path}.gz"
+            self.process = None
+            self.file = gzip.open(self.path, "wb", compresslevel=6)
+
+    def write(self, data):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        if self.process:
+            self.process.wait()
+
+
+class Capture:
+    def __init__(self, log_path=None, console="full"):
+        self.log_path = log_path
+        self.console = console
+        self.log = None
+        self.tail = collections.deque(maxlen=RING_LINES)
+        # First match of each pattern, the most specific one is reported
+        self.errors = [None] * len(ERROR_PATTERNS)
+        self.partial = b""
+
+    def write_log(self, data):
+        if not self.log_path:
+            return
+        try:
+            if not self.log:
+                self.log = CompressedLog(self.log_path)
+            self.log.write(data)
+        except OSError as e:
+            # A full disk loses the log, not the build
+            print(f"Cannot write the build log {self.log_path}: {e}")
+            self.log_path = None
+
+    def begin(self, command):
+        self.write_log(f"$ {' '.join(command)}\n".encode())
+
+    def end(self, returncode):
+        if self.partial:
+            self.tail.append(self.partial)
+            self.match(self.partial, self.console)
+            self.partial = b""
+        if returncode != 0:
+            self.write_log(f"exit status {returncode}\n".encode())
+
+    def feed(self, data, console):
+        if console == "full":
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+        self.write_log(data)
+        buffer = self.partial + data
+        lines = buffer.split(b"\n")
+        self.partial = lines.pop()
+        self.tail.extend(lines[-RING_LINES:])
+        # Most chunks hold nothing but progress lines, only look closer at the rest
+        if any(marker in buffer for marker in CONSOLE_MARKERS):
+            for line in lines:
+                self.match(line, console)
+
+    def match(self, line, console):
+        if console == "errors" and any(marker in line for marker in CONSOLE_MARKERS):
+            sys.stdout.buffer.write(line + b"\n")
+            sys.stdout.buffer.flush()
+        if not any(marker in line for marker in ERROR_MARKERS):
+            return
+        text = line.decode("utf-8", "replace").strip()
+        for index, pattern in enumerate(ERROR_PATTERNS):
+            if self.errors[index] is None and pattern.match(text):
+                self.errors[index] = text
+                break
+
+    def first_error(self):
+        return next((error for error in self.errors if error), None)
+
+    def close(self):
+        if self.log:
+            try:
+                self.log.close()
+            except OSError:
+                pass
+
+    def report(self):
+        error = self.first_error()
+        if error:
+            print(f"First error: {error}")
+        elif self.tail:
+            print(f"Last {min(TAIL_LINES, len(self.tail))} lines of output:")
+            for line in list(self.tail)[-TAIL_LINES:]:
+                print(f"    {line.decode('utf-8', 'replace')}")
+        if self.log:
+            print(f"Full log: {self.log.path}")
+
+
+@contextlib.contextmanager
+def stage(name, log_dir=None, console="full"):
+    global current
+    capture = Capture(os.path.join(log_dir, f"{name}.log") if log_dir else None, console)
+    previous, current = current, capture
+    try:
+        yield capture
+    finally:
+        current = previous
+        capture.close()
+
+
+def run(command, cwd=None, env=None, stdin=None, console=None):
+    # Like subprocess.run for commands whose output goes to the user: stdout
+    # and stderr stream to the console and into the stage log. Returns the exit status.
+    capture = current or Capture()
+    console = console or capture.console
+    capture.begin(command)
+    try:
+        process = subprocess.Popen(command, cwd=cwd, env=env, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except OSError as e:
+        capture.feed(f"{command[0]}: {e.strerror}\n".encode(), "full")
+        return 127
+    with process:
+        fd = process.stdout.fileno()
+        # Raw reads, so prompts without a newline still show up
+        data = os.read(fd, READ_SIZE)
+        while data:
+            capture.feed(data, console)
+            data = os.read(fd, READ_SIZE)
+        returncode = process.wait()
+    capture.end(returncode)
+    return returncode
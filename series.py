@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+
+import cache
+import farm
+
+SERIES_FILE = "series"
+PATCH_SUFFIXES = (".patch", ".diff")
+# Written into a patched tree, records which series it carries
+MARKER = ".kernel-builder-series"
+# Patched trees kept in the cache, least recently used go first
+MAX_TREES = 4
+
+
+class SeriesError(Exception):
+    pass
+
+
+def load_series(path):
+    # A quilt style series file, or a directory holding one; a directory
+    # without a series file applies every patch in it in name order
+    if os.path.isdir(path):
+        if not os.path.exists(os.path.join(path, SERIES_FILE)):
+            return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(PATCH_SUFFIXES)]
+        path = os.path.join(path, SERIES_FILE)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    patches = []
+    try:
+        with open(path) as series_file:
+            for number, line in enumerate(series_file, 1):
+                fields = line.split("#", 1)[0].split()
+                if not fields:
+                    continue
+                if fields[1:] not in ([], ["-p1"]):
+                    raise SeriesError(f"{path}:{number}: only -p1 patches are supported")
+                patches.append(os.path.join(base_dir, fields[0]))
+    except OSError as e:
+        raise SeriesError(f"Cannot read {path}: {e}")
+    missing = [patch for patch in patches if not os.path.exists(patch)]
+    if missing:
+        raise SeriesError(f"Patch not found: {', '.join(missing)}")
+    return patches
+
+
+def trees_dir():
+    return os.path.join(cache.cache_dir(), "trees")
+
+
+def series_key(tarball, patches):
+    if not patches or not os.path.isfile(tarball):
+        return None
+    parts = [cache.cached_sha256(tarball), [cache.sha256_file(patch) for patch in patches]]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def read_marker(srctree):
+    try:
+        with open(os.path.join(srctree, MARKER)) as marker:
+            return marker.read().strip()
+    except OSError:
+        return None
+
+
+def restore(key, srctree, debug=False):
+    cached = os.path.join(trees_dir(), key) if key else None
+    if not cached or read_marker(cached) != key or os.path.exists(srctree):
+        return False
+    if not farm.clone_tree(cached, srctree):
+        if debug:
+            print(f"Cannot clone {cached} into {srctree}, extracting instead")
+        return False
+    # Marks it as recently used for eviction
+    os.utime(cached)
+    return True
+
+
+def store(key, srctree, debug=False):
+    os.makedirs(trees_dir(), exist_ok=True)
+    target = os.path.join(trees_dir(), key)
+    if os.path.exists(target):
+        return
+    tmp = f"{target}.{os.getpid()}.tmp"
+    if not farm.clone_tree(srctree, tmp):
+        # Clones cannot cross filesystems, and a full copy costs more than patching again
+        if debug:
+            print(f"Cannot clone {srctree} into {trees_dir()}, not caching the patched tree")
+        return
+    os.replace(tmp, target)
+    evict(keep={key})
+
+
+def evict(max_trees=MAX_TREES, keep=()):
+    try:
+        names = [name for name in os.listdir(trees_dir()) if not name.endswith(".tmp")]
+    except OSError:
+        return
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(trees_dir(), name)), reverse=True)
+    for name in names[max_trees:]:
+        if name not in keep:
+            shutil.rmtree(os.path.join(trees_dir(), name), ignore_errors=True)
+
+
+def apply_series(srctree, patches, key=None, debug=False):
+    # The whole series is applied to a cloned scratch copy first, which
+    # checks every patch against the result of the ones before it (a per patch
+    # --dry-run cannot); the tree is only replaced once all of them applied
+    if not patches:
+        return 0
+    marker = read_marker(srctree)
+    if key and marker == key:
+        return 0
+    if marker:
+        raise SeriesError(f"{srctree} already carries another patch series, extract it again")
+
+    scratch = f"{srctree}.patching"
+    shutil.rmtree(scratch, ignore_errors=True)
+    if not farm.clone_tree(srctree, scratch):
+        raise SeriesError(f"Cannot create {scratch}")
+    try:
+        for patch in patches:
+            if debug:
+                print(f"Applying patch {patch}")
+            result = subprocess.run(["patch", "-p1", "--forward", "--batch", "-s", "-i", os.path.abspath(patch)], cwd=scratch, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise SeriesError(f"{os.path.basename(patch)} does not apply: {(result.stdout + result.stderr).strip()}")
+        if key:
+            with open(os.path.join(scratch, MARKER), "w") as marker_file:
+                marker_file.write(key)
+        old = f"{srctree}.old"
+        os.rename(srctree, old)
+        os.rename(scratch, srctree)
+        shutil.rmtree(old, ignore_errors=True)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    if key:
+        store(key, srctree, debug)
+    return len(patches)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import os
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+import compress
+import extractor
+import kconfig
+import pipeline
+import series
+import telemetry
+
+MONIKERS = ("mainline", "stable", "longterm")
+
+# Every key a spec may set, with the value used when it is left out
+DEFAULTS = {
+    "version": None,
+    "source": {"pipeline": None, "workers": None, "decompressor": None},
+    "packages": {"install": True},
+    "patches": {"files": [], "dir": None, "series": None},
+    "config": {"base": "running", "file": None, "fragments": [], "disable_keyrings": False, "trim": None},
+    "build": {"incremental": None, "compiler_cache": None, "compiler_cache_size": None, "jobs": None, "load_average": None, "compress": None, "profile": None, "profile_top": None},
+    "package": {"enabled": False, "output": "packages"},
+    "install": {"kernel": True, "initramfs": True, "bootloader": True},
+}
+
+# [install] keys and the pipeline stage each one turns off
+INSTALL_STAGES = {"kernel": "install", "initramfs": "initramfs", "bootloader": "bootloader"}
+
+EXIT_OK = 0
+EXIT_STAGE_FAILED = 1
+EXIT_BAD_SPEC = 2
+
+
+class SpecError(Exception):
+    pass
+
+
+def load_spec(path):
+    if tomllib is None:
+        raise SpecError("Reading build specs needs Python 3.11+ or the tomli package")
+    try:
+        with open(path, "rb") as spec_file:
+            data = tomllib.load(spec_file)
+    except OSError as e:
+        raise SpecError(f"Cannot read {path}: {e}")
+    except tomllib.TOMLDecodeError as e:
+        raise SpecError(f"Invalid TOML in {path}: {e}")
+
+    spec = {}
+    for key, default in DEFAULTS.items():
+        value = data.pop(key, default)
+        if isinstance(default, dict):
+            if not isinstance(value, dict):
+                raise SpecError(f"[{key}] must be a table")
+            unknown = set(value) - set(default)
+            if unknown:
+                raise SpecError(f"Unknown keys in [{key}]: {', '.join(sorted(unknown))}")
+            value = {**default, **value}
+        spec[key] = value
+    if data:
+        raise SpecError(f"Unknown keys: {', '.join(sorted(data))}")
+    if not spec["version"]:
+        raise SpecError("version is required")
+    if not isinstance(spec["version"], str):
+        # An unquoted 6.10 is the float 6.1 in TOML
+        raise SpecError(f'version must be a quoted string such as "6.10", not {spec["version"]!r}')
+    if spec["config"]["base"] not in kconfig.CONFIG_SOURCES:
+        raise SpecError(f"config.base must be one of {', '.join(kconfig.CONFIG_SOURCES)}")
+    if spec["build"]["compress"] not in (None, *compress.CHOICES):
+        raise SpecError(f"build.compress must be one of {', '.join(compress.CHOICES)}")
+    if spec["source"]["decompressor"] not in (None, *extractor.CHOICES):
+        raise SpecError(f"source.decompressor must be one of {', '.join(extractor.CHOICES)}")
+    workers = spec["source"]["workers"]
+    if workers is not None and (not isinstance(workers, int) or isinstance(workers, bool) or workers < 1):
+        raise SpecError("source.workers must be a positive integer")
+
+    # Paths in the spec are relative to the spec file, not to the build directory
+    base_dir = os.path.dirname(os.path.abspath(path))
+    resolve = lambda name: os.path.join(base_dir, os.path.expanduser(name))
+    spec["patches"]["files"] = [resolve(name) for name in spec["patches"]["files"]]
+    for key in ("dir", "series"):
+        if spec["patches"][key]:
+            spec["patches"][key] = resolve(spec["patches"][key])
+    if spec["config"]["file"]:
+        spec["config"]["file"] = resolve(spec["config"]["file"])
+    spec["config"]["fragments"] = [resolve(name) for name in spec["config"]["fragments"]]
+    if spec["config"]["trim"] and spec["config"]["trim"] != kconfig.TRIM_LOADED:
+        spec["config"]["trim"] = resolve(spec["config"]["trim"])
+    spec["package"]["output"] = resolve(spec["package"]["output"])
+    if spec["build"]["profile"]:
+        spec["build"]["profile"] = resolve(spec["build"]["profile"])
+    return spec
+
+
+def patch_files(spec):
+    files = list(spec["patches"]["files"])
+    patch_dir = spec["patches"]["dir"]
+    if patch_dir and not os.path.isdir(patch_dir):
+        raise SpecError(f"Patch directory {patch_dir} not found")
+    for source in (patch_dir, spec["patches"]["series"]):
+        if source:
+            try:
+                files += series.load_series(source)
+            except series.SeriesError as e:
+                raise SpecError(str(e))
+    missing = [name for name in files if not os.path.exists(name)]
+    if missing:
+        raise SpecError(f"Patch not found: {', '.join(missing)}")
+    return files
+
+
+def resolve_version(version, distro_module, debug=False, offline=False):
+    if version not in MONIKERS:
+        return version
+    for release in distro_module.get_available_versions(debug, offline):
+        if release.get("moniker") == version:
+            return release.get("version")
+    raise SpecError(f"No {version} release found in releases.json")
+
+
+def apply_options(spec, options):
+    # Spec settings win over command line defaults
+    for section, keys in (("source", ("pipeline", "workers", "decompressor")), ("build", DEFAULTS["build"])):
+        for key in keys:
+            value = spec[section][key]
+            if value is not None:
+                setattr(options, key, value)
+    # Same default as the command line: a compiler cache only for incremental builds
+    if spec["build"]["incremental"] is not None and spec["build"]["compiler_cache"] is None:
+        options.compiler_cache = "auto" if spec["build"]["incremental"] else "none"
+    if spec["package"]["enabled"]:
+        options.package_dir = spec["package"]["output"]
+    return options
+
+
+def skipped_stages(spec):
+    return [INSTALL_STAGES[name] for name, enabled in spec["install"].items() if not enabled]
+
+
+def run_spec(spec, distro_module, options):
+    debug = options.debug
+    options = apply_options(spec, options)
+    try:
+        version = resolve_version(spec["version"], distro_module, debug, options.offline)
+        patches = patch_files(spec)
+    except SpecError as e:
+        print(f"Build spec error: {e}")
+        return EXIT_BAD_SPEC
+
+    config = spec["config"]
+    if spec["packages"]["install"] and not distro_module.install_packages(debug, assume_yes=True):
+        print(f"Build of linux-{version} failed in the packages stage")
+        return EXIT_STAGE_FAILED
+
+    trim = config["trim"] or options.trim_modules
+    configure = lambda: distro_module.configure_kernel(version, debug, config["base"], config["file"], config["fragments"], config["disable_keyrings"], trim)
+    configure_inputs = lambda: [config["base"], pipeline.file_digest(config["file"]), [pipeline.file_digest(name) for name in config["fragments"]], config["disable_keyrings"], trim, pipeline.file_digest(trim)]
+    stages = pipeline.kernel_stages(distro_module, version, options, patches, configure, configure_inputs, skipped_stages(spec))
+    recorder = telemetry.Recorder(version, options.telemetry, options.prometheus)
+    if not recorder.finish(pipeline.run_stages(stages, version, options.resume, recorder=recorder, log_dir=options.log_dir, console=options.build_output)):
+        return EXIT_STAGE_FAILED
+    print(f"Build of linux-{version} completed")
+    return EXIT_OK
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import json
+import os
+import resource
+import sys
+import time
+
+import cache
+
+EVENT_LOG = "events.jsonl"
+METRIC_PREFIX = "kernel_builder"
+# Prometheus metric -> (stage record field, help text)
+METRICS = {
+    "stage_duration_seconds": ("wall", "Wall time of the build stage"),
+    "stage_cpu_seconds": ("cpu", "CPU time of kernel-builder and its child processes during the stage"),
+    "stage_children_max_rss_bytes": ("max_rss", "Largest RSS of any child process so far in the run"),
+    "stage_downloaded_bytes": ("downloaded", "Bytes downloaded during the stage"),
+    "stage_written_bytes": ("written", "Bytes written by kernel-builder and its child processes during the stage"),
+    "stage_success": ("ok", "1 if the stage succeeded"),
+}
+
+
+def default_log_path():
+    return os.path.join(cache.cache_dir(), EVENT_LOG)
+
+
+def io_counters():
+    # Includes the I/O of every child process that has been waited for
+    counters = {}
+    try:
+        with open("/proc/self/io") as io_file:
+            for line in io_file:
+                key, _, value = line.partition(":")
+                counters[key] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters
+
+
+def downloaded_bytes():
+    # Only stages that fetch something import the downloader
+    downloader = sys.modules.get("downloader")
+    return downloader.received_bytes() if downloader else 0
+
+
+def snapshot():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "wall": time.monotonic(),
+        "cpu": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        # ru_maxrss is in KiB and only ever grows, it is the largest child so far
+        "max_rss": children.ru_maxrss * 1024,
+        "downloaded": downloaded_bytes(),
+        "written": io_counters().get("wchar", 0),
+    }
+
+
+class Recorder:
+    def __init__(self, version, log_path=None, prometheus_path=None):
+        self.version = version
+        self.log_path = log_path or default_log_path()
+        self.prometheus_path = prometheus_path
+        self.run_id = f"{int(time.time())}-{os.getpid()}"
+        self.records = []
+        self.log_failed = False
+        self.event("run_start")
+
+    def event(self, kind, **fields):
+        entry = {"time": round(time.time(), 3), "run": self.run_id, "version": self.version, "event": kind, **fields}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            with open(self.log_path, "a") as log_file:
+                log_file.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            # Telemetry never fails a build
+            if not self.log_failed:
+                print(f"Cannot write the event log {self.log_path}: {e}")
+            self.log_failed = True
+
+    def skip(self, name):
+        self.event("stage_skip", stage=name)
+
+    def stage(self, name, run):
+        self.event("stage_start", stage=name)
+        before = snapshot()
+        ok = False
+        try:
+            ok = bool(run())
+            return ok
+        finally:
+            after = snapshot()
+            record = {
+                "stage": name,
+                "ok": ok,
+                "wall": round(after["wall"] - before["wall"], 3),
+                "cpu": round(after["cpu"] - before["cpu"], 3),
+                "max_rss": after["max_rss"],
+                "downloaded": after["downloaded"] - before["downloaded"],
+                "written": after["written"] - before["written"],
+            }
+            self.records.append(record)
+            self.event("stage_end", **record)
+
+    def finish(self, ok):
+        self.event("run_end", ok=ok, wall=round(sum(record["wall"] for record in self.records), 3))
+        if self.records:
+            print_summary(self.records)
+        if self.prometheus_path:
+            try:
+                write_prometheus(self.prometheus_path, self.version, self.records)
+            except OSError as e:
+                print(f"Cannot write Prometheus metrics to {self.prometheus_path}: {e}")
+        return ok
+
+
+def print_summary(records):
+    print(f"{'stage':<12} {'status':<8}{'wall':>10}{'cpu':>10}{'max rss':>12}{'downloaded':>12}{'written':>12}")
+    for record in records:
+        status = "ok" if record["ok"] else "failed"
+        sizes = "".join(f"{cache.format_size(record[field]):>12}" for field in ("max_rss", "downloaded", "written"))
+        print(f"{record['stage']:<12} {status:<8}{record['wall']:>9.1f}s{record['cpu']:>9.1f}s{sizes}")
+    print(f"{'total':<12} {'':<8}{sum(record['wall'] for record in records):>9.1f}s{sum(record['cpu'] for record in records):>9.1f}s")
+
+
+def write_prometheus(path, version, records):
+    # Textfile collector format, replaced atomically so node_exporter never
+    # reads a half written file
+    lines = []
+    for metric, (field, help_text) in METRICS.items():
+        name = f"{METRIC_PREFIX}_{metric}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{stage="{record["stage"]}",version="{version}"}} {float(record[field]):g}' for record in records]
+    name = f"{METRIC_PREFIX}_last_run_timestamp_seconds"
+    lines += [f"# HELP {name} When the last build finished", f"# TYPE {name} gauge", f'{name}{{version="{version}"}} {time.time():.0f}']
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as metrics_file:
+        metrics_file.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
@@ -0,0 +1,83 @@
+import pytest
+
+import bootloader
+
+RELEASE = "6.9.0-test"
+MACHINE_ID = "0123456789abcdef0123456789abcdef"
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "root"
+    (root / "boot").mkdir(parents=True)
+    (root / "etc/kernel").mkdir(parents=True)
+    (root / "boot" / f"vmlinuz-{RELEASE}").write_bytes(b"kernel")
+    (root / "boot" / f"initramfs-{RELEASE}.img").write_bytes(b"initramfs")
+    (root / "etc/machine-id").write_text(f"{MACHINE_ID}\n")
+    (root / "etc/kernel/cmdline").write_text("root=/dev/sda2 rw quiet\n")
+    return root
+
+
+class Regenerate:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, loader):
+        self.calls.append(loader)
+        return True
+
+
+def systemd_boot(root):
+    (root / "boot/EFI/systemd").mkdir(parents=True)
+    (root / "boot/EFI/systemd/systemd-bootx64.efi").write_bytes(b"efi")
+    (root / "boot/loader").mkdir()
+
+
+def grub(root, bls=False):
+    (root / "boot/grub2").mkdir()
+    (root / "boot/grub2/grub.cfg").write_text("")
+    (root / "etc/default").mkdir()
+    (root / "etc/default/grub").write_text('GRUB_ENABLE_BLSCFG=true\n' if bls else 'GRUB_TIMEOUT=5\n')
+
+
+def test_systemd_boot_gets_an_entry(root):
+    systemd_boot(root)
+    regenerate = Regenerate()
+    assert bootloader.update(RELEASE, regenerate, root=str(root))
+    assert not regenerate.calls
+    entry = (root / "boot/loader/entries" / f"{MACHINE_ID}-{RELEASE}.conf").read_text()
+    assert f"version {RELEASE}" in entry
+    assert f"linux /boot/vmlinuz-{RELEASE}" in entry
+    assert f"initrd /boot/initramfs-{RELEASE}.img" in entry
+    assert "options root=/dev/sda2 rw quiet" in entry
+
+
+def test_grub_with_bls_gets_an_entry(root):
+    grub(root, bls=True)
+    regenerate = Regenerate()
+    assert bootloader.update(RELEASE, regenerate, root=str(root))
+    assert not regenerate.calls
+    assert (root / "boot/loader/entries" / f"{MACHINE_ID}-{RELEASE}.conf").exists()
+
+
+def test_plain_grub_is_regenerated(root):
+    grub(root)
+    regenerate = Regenerate()
+    assert bootloader.update(RELEASE, regenerate, root=str(root))
+    assert regenerate.calls == [{"name": "grub", "esp": None, "bls": False}]
+    assert not (root / "boot/loader/entries").exists()
+
+
+def test_existing_entry_is_not_duplicated(root):
+    systemd_boot(root)
+    (root / "boot/loader/entries").mkdir()
+    (root / "boot/loader/entries/arch.conf").write_text(f"title Arch Linux\nlinux /vmlinuz-{RELEASE}\n")
+    assert bootloader.update(RELEASE, Regenerate(), root=str(root))
+    assert [path.name for path in (root / "boot/loader/entries").iterdir()] == ["arch.conf"]
+
+
+def test_no_release_regenerates(root):
+    systemd_boot(root)
+    regenerate = Regenerate()
+    assert bootloader.update(None, regenerate, root=str(root))
+    assert regenerate.calls[0]["name"] == "systemd-boot"
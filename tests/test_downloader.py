@@ -0,0 +1,109 @@
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import downloader
+
+ETAG = '"linux-test"'
+# Two and a half segments, so the last one is short
+PAYLOAD = random.Random(0).randbytes(downloader.SEGMENT_SIZE * 5 // 2)
+
+
+class Handler(BaseHTTPRequestHandler):
+    # server.mode: "ranged", "ignore-range" (always 200 with the whole file)
+    # or "short" (the body stops half way, with no length to give it away)
+    def do_GET(self):
+        mode = self.server.mode
+        header = self.headers.get("Range")
+        self.server.requests.append(header)
+        start, end = 0, len(PAYLOAD) - 1
+        if header and mode != "ignore-range":
+            first, _, last = header.removeprefix("bytes=").partition("-")
+            start, end = int(first), min(int(last), len(PAYLOAD) - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", ETAG)
+        body = PAYLOAD[start:end + 1]
+        if mode == "short" and end > start:
+            body = body[:len(body) // 2]
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.mode = "ranged"
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/linux-test.tar.xz"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_segmented_download(server, tmp_path):
+    target = tmp_path / "linux-test.tar.xz"
+    assert downloader.download_file(server.url, str(target), workers=4) == len(PAYLOAD)
+    assert target.read_bytes() == PAYLOAD
+    ranges = [header for header in server.requests if header != "bytes=0-0"]
+    assert len(ranges) == len(downloader.split_ranges(len(PAYLOAD)))
+    assert not (tmp_path / "linux-test.tar.xz.part.state").exists()
+
+
+def test_server_ignoring_range_falls_back_to_one_stream(server, tmp_path):
+    server.mode = "ignore-range"
+    target = tmp_path / "linux-test.tar.xz"
+    assert downloader.download_file(server.url, str(target), workers=4) == len(PAYLOAD)
+    assert target.read_bytes() == PAYLOAD
+    # The probe, then one plain GET
+    assert server.requests == ["bytes=0-0", None]
+
+
+def test_resume_fetches_only_missing_segments(server, tmp_path):
+    target = tmp_path / "linux-test.tar.xz"
+    segments = downloader.split_ranges(len(PAYLOAD))
+    first_end = segments[0][1]
+    part = tmp_path / "linux-test.tar.xz.part"
+    part.write_bytes(PAYLOAD[:first_end + 1] + bytes(len(PAYLOAD) - first_end - 1))
+    state = {"url": server.url, "size": len(PAYLOAD), "etag": ETAG, "segment_size": downloader.SEGMENT_SIZE, "done": [0]}
+    (tmp_path / "linux-test.tar.xz.part.state").write_text(json.dumps(state))
+
+    downloader.download_file(server.url, str(target), workers=4)
+    assert target.read_bytes() == PAYLOAD
+    requested = [header for header in server.requests if header != "bytes=0-0"]
+    assert f"bytes=0-{first_end}" not in requested
+    assert len(requested) == len(segments) - 1
+
+
+def test_changed_file_restarts_download(server, tmp_path):
+    target = tmp_path / "linux-test.tar.xz"
+    part = tmp_path / "linux-test.tar.xz.part"
+    part.write_bytes(bytes(len(PAYLOAD)))
+    state = {"url": server.url, "size": len(PAYLOAD), "etag": '"older"', "segment_size": downloader.SEGMENT_SIZE, "done": [0]}
+    (tmp_path / "linux-test.tar.xz.part.state").write_text(json.dumps(state))
+
+    downloader.download_file(server.url, str(target), workers=4)
+    assert target.read_bytes() == PAYLOAD
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_short_read_raises(server, tmp_path, workers):
+    server.mode = "short"
+    target = tmp_path / "linux-test.tar.xz"
+    with pytest.raises(downloader.DownloadError, match="Short read"):
+        downloader.download_file(server.url, str(target), workers=workers)
+    assert not target.exists()
@@ -0,0 +1,23 @@
+import os
+
+import farm
+
+
+def test_evict_removes_trees_and_their_locks(cache_dir):
+    sources = cache_dir / "sources"
+    for index, name in enumerate(("old", "middle", "new")):
+        (sources / name / "linux-6.9").mkdir(parents=True)
+        farm.lock(str(sources / name)).close()
+        os.utime(sources / name, (index, index))
+    farm.evict(max_sources=1)
+    assert sorted(os.listdir(sources)) == ["new", "new.lock"]
+
+
+def test_evict_keeps_a_locked_tree(cache_dir):
+    sources = cache_dir / "sources"
+    for index, name in enumerate(("busy", "new")):
+        (sources / name).mkdir(parents=True)
+        os.utime(sources / name, (index, index))
+    with farm.lock(str(sources / "busy")):
+        farm.evict(max_sources=1)
+        assert (sources / "busy").is_dir()
@@ -0,0 +1,40 @@
+import subprocess
+
+import pytest
+
+import packages
+
+OUTPUT = {
+    "pacman": "bc\nflex\n",
+    "dpkg-query": "gcc ii \nflex un \nbc ii \n",
+    "rpm": "gcc-14.1.1-7.fc40.x86_64\nno package provides flex\nbc-1.07.1-21.fc40.x86_64\nno package provides openssl-devel\n",
+}
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    calls = []
+
+    def run(command, **kwargs):
+        calls.append(command)
+        # Both tools exit non-zero when anything is missing
+        return subprocess.CompletedProcess(command, 1, stdout=OUTPUT[command[0]], stderr="")
+
+    monkeypatch.setattr(packages.subprocess, "run", run)
+    return calls
+
+
+@pytest.mark.parametrize("manager, requested, missing", [
+    ("pacman", ["gcc", "bc", "flex"], ["bc", "flex"]),
+    ("apt", ["gcc", "flex", "bc", "libssl-dev"], ["flex", "libssl-dev"]),
+    ("dnf", ["gcc", "flex", "bc", "openssl-devel"], ["flex", "openssl-devel"]),
+])
+def test_missing_packages(commands, manager, requested, missing):
+    assert packages.missing_packages(manager, requested) == missing
+    assert len(commands) == 1
+    assert commands[0][-len(requested):] == requested
+
+
+def test_unknown_manager():
+    with pytest.raises(ValueError):
+        packages.missing_packages("zypper", ["gcc"])
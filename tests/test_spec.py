@@ -0,0 +1,58 @@
+import argparse
+
+import pytest
+
+import pipeline
+import spec
+
+
+def write(tmp_path, text):
+    path = tmp_path / "kernel.toml"
+    path.write_text(text)
+    return str(path)
+
+
+def test_version_string(tmp_path):
+    assert spec.load_spec(write(tmp_path, 'version = "6.10"\n'))["version"] == "6.10"
+
+
+@pytest.mark.parametrize("version", ["6.10", "6", "[6.10]"])
+def test_unquoted_version_is_rejected(tmp_path, version):
+    with pytest.raises(spec.SpecError, match="quoted string"):
+        spec.load_spec(write(tmp_path, f"version = {version}\n"))
+
+
+def options(**values):
+    defaults = {"pipeline": False, "workers": 8, "decompressor": "auto", "incremental": False, "compiler_cache": "none", "package_dir": None}
+    return argparse.Namespace(**{**defaults, **values})
+
+
+def test_unset_keys_keep_command_line_values(tmp_path):
+    loaded = spec.load_spec(write(tmp_path, 'version = "6.10"\n'))
+    applied = spec.apply_options(loaded, options(pipeline=True, incremental=True, compiler_cache="auto"))
+    assert applied.pipeline and applied.incremental
+    assert applied.compiler_cache == "auto"
+
+
+def test_spec_values_win(tmp_path):
+    loaded = spec.load_spec(write(tmp_path, 'version = "6.10"\n[source]\npipeline = false\nworkers = 2\n[build]\nincremental = false\n'))
+    applied = spec.apply_options(loaded, options(pipeline=True, incremental=True, compiler_cache="auto"))
+    assert not applied.pipeline and not applied.incremental
+    assert applied.workers == 2
+    assert applied.compiler_cache == "none"
+
+
+@pytest.mark.parametrize("source, message", [
+    ('decompressor = "gzip"', "source.decompressor"),
+    ("workers = 0", "source.workers"),
+    ('workers = "8"', "source.workers"),
+])
+def test_invalid_source_is_rejected(tmp_path, source, message):
+    with pytest.raises(spec.SpecError, match=message):
+        spec.load_spec(write(tmp_path, f'version = "6.10"\n[source]\n{source}\n'))
+
+
+def test_disabled_install_keys_skip_their_stages(tmp_path):
+    loaded = spec.load_spec(write(tmp_path, 'version = "6.10"\n[install]\nkernel = false\nbootloader = false\n'))
+    stages = pipeline.kernel_stages(None, "6.10", options(debug=False), [], None, None, spec.skipped_stages(loaded))
+    assert [stage.name for stage in stages] == ["fetch", "extract", "patch", "configure", "compile", "initramfs"]